@@ -0,0 +1,70 @@
+# ruff: noqa
+"""
+Small load generator to compare server profiles. It must run outside the container, like populate_db_via_cli.py.
+
+It sends requests to the given paths for a fixed duration with a number of concurrent clients,
+and prints throughput and latency percentiles. Example:
+
+    python benchmark_api.py --duration 30 --concurrency 32 /books/ /books/?page=500
+
+For detail requests, pass book URLs that exist in your database. They are served from cache after the first hit,
+so list pages are the better way to measure the database path.
+"""
+
+import argparse
+import itertools
+import statistics
+import threading
+import time
+
+import httpx
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("paths", nargs="+", help="Paths to request, in round robin")
+parser.add_argument("--base-url", default="http://localhost:8000")
+parser.add_argument("--duration", type=float, default=30, help="Seconds to run the benchmark for")
+parser.add_argument("--concurrency", type=int, default=16, help="Number of concurrent clients")
+args = parser.parse_args()
+
+latencies = []
+errors = 0
+lock = threading.Lock()
+deadline = time.perf_counter() + args.duration
+
+
+def client(offset):
+    global errors
+    local_latencies = []
+    local_errors = 0
+    paths = itertools.islice(itertools.cycle(args.paths), offset, None)
+    with httpx.Client(base_url=args.base_url, timeout=10) as http:
+        for path in paths:
+            if time.perf_counter() > deadline:
+                break
+            start = time.perf_counter()
+            try:
+                response = http.get(path)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                local_errors += 1
+                continue
+            local_latencies.append(time.perf_counter() - start)
+    with lock:
+        latencies.extend(local_latencies)
+        errors += local_errors
+
+
+threads = [threading.Thread(target=client, args=(i,)) for i in range(args.concurrency)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+
+if not latencies:
+    print(f"No successful requests ({errors} errors)")
+    raise SystemExit(1)
+
+quantiles = statistics.quantiles(latencies, n=100)
+print(f"Requests:   {len(latencies)} ok, {errors} errors")
+print(f"Throughput: {len(latencies) / args.duration:.1f} requests/s")
+print(f"Latency:    p50 {quantiles[49] * 1000:.1f}ms, p95 {quantiles[94] * 1000:.1f}ms, p99 {quantiles[98] * 1000:.1f}ms")
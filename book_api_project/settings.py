@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+from copy import deepcopy
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,15 +46,31 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "books.middleware.ServerTimingMiddleware",
+    "books.middleware.MetricsMiddleware",
+    "books.middleware.ReadYourWritesMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
+    "books.middleware.FullStackMiddleware",
+]
+
+# Middleware that are only needed by the admin and the docs. They run inside books.middleware.FullStackMiddleware,
+# which skips them for the API in API mode.
+FULL_STACK_MIDDLEWARE = [
+    "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# In API mode, API requests skip FULL_STACK_MIDDLEWARE and content negotiation (see books/negotiation.py).
+API_MODE = os.environ.get("DJANGO_API_MODE", "True") == "True"
+API_MODE_PATH_PREFIXES = ["/books/", "/metrics/"]
+
+# The admin checks for its middleware in MIDDLEWARE, but they are in FULL_STACK_MIDDLEWARE
+SILENCED_SYSTEM_CHECKS = ["admin.E408", "admin.E409", "admin.E410"]
+
 ROOT_URLCONF = "book_api_project.urls"
 
 TEMPLATES = [
@@ -88,6 +105,47 @@ DATABASES = {
     }
 }
 
+# With DJANGO_DB_POOL=True every worker process keeps a psycopg connection pool, which is checked out per request.
+# Connections are health checked when they leave the pool. Each gunicorn thread may hold one connection,
+# so DJANGO_DB_POOL_MAX_SIZE should be at least GUNICORN_THREADS.
+# Without the pool, connections are reused for DJANGO_DB_CONN_MAX_AGE seconds (0 opens one per request).
+# Either way, CONN_HEALTH_CHECKS checks the connections: with the pool, Django passes psycopg_pool's check to it, and
+# psycopg_pool is only imported when the pool is enabled.
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+if os.environ.get("DJANGO_DB_POOL") == "True":
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.environ.get("DJANGO_DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.environ.get("DJANGO_DB_POOL_MAX_SIZE", "8")),
+            "timeout": float(os.environ.get("DJANGO_DB_POOL_TIMEOUT", "10")),
+        },
+    }
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.environ.get("DJANGO_DB_CONN_MAX_AGE", "0"))
+
+# Read replicas, as a comma separated list of hosts sharing the primary's port, database name and credentials.
+# Reads go to a random replica and writes go to the primary, see books/routers.py.
+# After a client writes, its reads stay on the primary for DJANGO_READ_YOUR_WRITES_SECONDS.
+DATABASE_REPLICAS: list[str] = []
+for index, replica_host in enumerate(filter(None, os.environ.get("POSTGRES_REPLICA_HOSTS", "").split(","))):
+    DATABASES[f"replica_{index}"] = {
+        **deepcopy(DATABASES["default"]),
+        "HOST": replica_host,
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica_{index}")
+
+DATABASE_ROUTERS = ["books.routers.PrimaryReplicaRouter"]
+
+READ_YOUR_WRITES_SECONDS = int(os.environ.get("DJANGO_READ_YOUR_WRITES_SECONDS", "5"))
+
+# The change feed only returns changes older than this, see books/changes.py
+CHANGE_FEED_DELAY_SECONDS = int(os.environ.get("DJANGO_CHANGE_FEED_DELAY_SECONDS", "10"))
+# Live change stream, see books/streaming.py. Subscribers more than DJANGO_CHANGE_STREAM_QUEUE_SIZE events behind
+# are disconnected, and resume from their last event.
+CHANGE_STREAM_QUEUE_SIZE = int(os.environ.get("DJANGO_CHANGE_STREAM_QUEUE_SIZE", "1000"))
+CHANGE_STREAM_HEARTBEAT_SECONDS = int(os.environ.get("DJANGO_CHANGE_STREAM_HEARTBEAT_SECONDS", "15"))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -131,16 +189,48 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.redis.RedisCache",
-        "LOCATION": os.environ["REDIS_URL"],
+        # Comma separated. The keys are sharded over all the locations, see books/cache.py
+        "BACKEND": "books.cache.InstrumentedShardedRedisCache",
+        "LOCATION": os.environ.get("CACHE_REDIS_URLS", os.environ["REDIS_URL"]),
     }
 }
 
+THROTTLE_REDIS_URL = os.environ.get("THROTTLE_REDIS_URL", os.environ["REDIS_URL"])
+
+# Bloom filter of the ISBNs in the catalog, to answer 404s without a query. See books/bloom.py
+ISBN_BLOOM_FILTER_REDIS_URL = os.environ.get("ISBN_BLOOM_FILTER_REDIS_URL", os.environ["REDIS_URL"])
+ISBN_BLOOM_FILTER_CAPACITY = int(os.environ.get("ISBN_BLOOM_FILTER_CAPACITY", "5000000"))
+ISBN_BLOOM_FILTER_ERROR_RATE = float(os.environ.get("ISBN_BLOOM_FILTER_ERROR_RATE", "0.01"))
+
+# Number of hash partitions of the books table, 0 to keep one table. Postgres only, see books/partitioning.py
+BOOKS_TABLE_PARTITIONS = int(os.environ.get("DJANGO_BOOKS_TABLE_PARTITIONS", "0"))
+
+# Books not updated for this many days are moved to the archive table by `python manage.py archive_books`.
+# See books/archive.py
+ARCHIVE_AFTER_DAYS = int(os.environ.get("DJANGO_ARCHIVE_AFTER_DAYS", "365"))
+
+# Keys of the OpenLibrary edition JSON returned and cached in `raw_openlibrary_data`, comma separated. "*" keeps them all
+OPENLIBRARY_FIELDS = os.environ.get(
+    "DJANGO_OPENLIBRARY_FIELDS",
+    "key,title,subtitle,authors,works,publishers,publish_date,number_of_pages,physical_format,covers,languages,description",
+).split(",")
+
+# Share of requests (0 to 1) that get a Server-Timing header and a timings log line.
+# See books/middleware.py
+SERVER_TIMING_SAMPLE_RATE = float(os.environ.get("SERVER_TIMING_SAMPLE_RATE", "0.01"))
+
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": [
         "rest_framework.renderers.JSONRenderer"
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [],
+    # Requests per client and per action, see books/throttling.py
+    "DEFAULT_THROTTLE_RATES": {
+        "books-cheap": os.environ.get("DJANGO_THROTTLE_CHEAP_RATE", "1200/min"),
+        "books-expensive": os.environ.get("DJANGO_THROTTLE_EXPENSIVE_RATE", "120/min"),
+    },
+    # Clients are rate limited by IP address. Behind DJANGO_NUM_PROXIES proxies, it is read from X-Forwarded-For
+    "NUM_PROXIES": int(os.environ["DJANGO_NUM_PROXIES"]) if "DJANGO_NUM_PROXIES" in os.environ else None,
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "TITLE": "Books API",
     "VERSION": "0.1.0",
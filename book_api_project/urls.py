@@ -1,11 +1,11 @@
 from django.contrib import admin
 from django.urls import include, path
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-)
+from drf_spectacular.views import SpectacularSwaggerView
 from rest_framework.routers import DefaultRouter
 
+from books.metrics import metrics_view
+from books.schema import CachedSpectacularAPIView
+from books.streaming import stream_changes
 from books.views import BookViewSet
 
 router = DefaultRouter()
@@ -13,9 +13,11 @@ router.register("books", BookViewSet)
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("books/changes/stream/", stream_changes, name="book-changes-stream"),
     path("", include(router.urls)),
+    path("metrics/", metrics_view, name="metrics"),
     # drf-spectacular URLs for interactive API documentation
-    path("schema/", SpectacularAPIView.as_view(), name="schema"),
+    path("schema/", CachedSpectacularAPIView.as_view(), name="schema"),
     path("swagger-ui/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui")
 
 ]
@@ -0,0 +1,140 @@
+"""
+Archive of the books that were not updated for settings.ARCHIVE_AFTER_DAYS days.
+
+Most requests are about recent books, but every index, vacuum and `COUNT(*)` of the books table pays for all of them.
+`python manage.py archive_books` moves the old ones to ArchivedBook, a table with the same columns and only the index
+of the change feed, in small batches, so the books table only holds the books that are still used.
+
+Archived books are still part of the catalog:
+- detail requests fall through to the archive when a book is not in the books table, and updates and deletes, bulk
+  ones included, move the book back first (see `BookViewSet.get_object`), so the write is done like any other;
+- the catalog statistics and the ISBN Bloom filter count them, and moves don't change either;
+- the change feed merges them with the books and the tombstones, so a mirror syncing from the start gets them too;
+- moves don't notify the change stream and are not changes in the change feed, since the books didn't change: they
+  keep their `updated_at`, so their position in the feed is the same in both tables.
+List, filters, title autocomplete and bulk actions only see the books table.
+
+Moves are raw `INSERT ... SELECT` and `DELETE` statements, so they skip the Book signals and the rows don't go through
+Python.
+"""
+
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from books import autocomplete
+from books.models import ArchivedBook, Book
+
+BATCH_SIZE = 1000
+
+
+def _tables(connection):
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(field.column) for field in Book._meta.concrete_fields)  # noqa: SLF001
+    return quote(Book._meta.db_table), quote(ArchivedBook._meta.db_table), columns  # noqa: SLF001
+
+
+@contextmanager
+def _skip_change_notifications(cursor, connection):
+    # The trigger of migration 0012 doesn't NOTIFY, or write tombstones, while this is set. It is set until the end of
+    # the transaction, which can be a bulk update or delete that has to notify its own writes, so it is reset after
+    if connection.vendor != "postgresql":
+        yield
+        return
+    cursor.execute("SET LOCAL books.skip_change_notify = 'on'")
+    yield
+    cursor.execute("SET LOCAL books.skip_change_notify = 'off'")
+
+
+def _isbn_params(isbns):
+    return [Book._meta.pk.get_prep_value(isbn) for isbn in isbns]  # noqa: SLF001
+
+
+def archive_batch(cutoff, batch_size=BATCH_SIZE):
+    """Moves up to `batch_size` books last updated before `cutoff` to the archive. Returns how many were moved."""
+    using = router.db_for_write(Book)
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        # Books locked by a write are left for the next run
+        isbns = list(
+            Book.objects.using(using)
+            .select_for_update(skip_locked=True)
+            .filter(updated_at__lt=cutoff)
+            .order_by("updated_at", "isbn")
+            .values_list("isbn", flat=True)[:batch_size]
+        )
+        if not isbns:
+            return 0
+        book_table, archive_table, columns = _tables(connection)
+        placeholders = ", ".join(["%s"] * len(isbns))
+        params = _isbn_params(isbns)
+        archived_at = connection.ops.adapt_datetimefield_value(timezone.now())
+        with connection.cursor() as cursor, _skip_change_notifications(cursor, connection):
+            # A book that was written while it was being archived is in both tables. Its archived copy is outdated
+            cursor.execute(f"DELETE FROM {archive_table} WHERE isbn IN ({placeholders})", params)  # noqa: S608
+            cursor.execute(
+                f"INSERT INTO {archive_table} ({columns}, archived_at) "  # noqa: S608
+                f"SELECT {columns}, %s FROM {book_table} WHERE isbn IN ({placeholders})",
+                [archived_at, *params],
+            )
+            cursor.execute(f"DELETE FROM {book_table} WHERE isbn IN ({placeholders})", params)  # noqa: S608
+    # Archived titles are no longer suggested
+    autocomplete.invalidate()
+    return len(isbns)
+
+
+def archive(days=None, batch_size=BATCH_SIZE, pause=0.1, progress=None):
+    """
+    Moves the books not updated for `days` days (default settings.ARCHIVE_AFTER_DAYS) to the archive, one batch per
+    transaction, sleeping `pause` seconds between batches to leave room for the other queries.
+    Calls `progress` with the number of books moved after each batch. Returns the total.
+    """
+    cutoff = timezone.now() - timedelta(days=settings.ARCHIVE_AFTER_DAYS if days is None else days)
+    total = 0
+    while moved := archive_batch(cutoff, batch_size):
+        total += moved
+        if progress is not None:
+            progress(total)
+        time.sleep(pause)
+    return total
+
+
+def get_archived(isbn):
+    """Returns the archived book with this ISBN as an (unsaved) Book, or None if it is not archived."""
+    if (archived := ArchivedBook.objects.filter(isbn=isbn).first()) is None:
+        return None
+    return archived.as_book()
+
+
+def restore_many(isbns):
+    """Moves the archived books among `isbns` back to the books table. Returns the ISBNs that were archived."""
+    using = router.db_for_write(Book)
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        # Concurrent restores of the same books wait here, and find nothing to restore
+        archived = list(
+            ArchivedBook.objects.using(using).select_for_update().filter(isbn__in=isbns).values_list("isbn", flat=True)
+        )
+        if not archived:
+            return []
+        book_table, archive_table, columns = _tables(connection)
+        placeholders = ", ".join(["%s"] * len(archived))
+        params = _isbn_params(archived)
+        with connection.cursor() as cursor, _skip_change_notifications(cursor, connection):
+            cursor.execute(
+                f"INSERT INTO {book_table} ({columns}) SELECT {columns} FROM {archive_table} "  # noqa: S608
+                f"WHERE isbn IN ({placeholders})",
+                params,
+            )
+            cursor.execute(f"DELETE FROM {archive_table} WHERE isbn IN ({placeholders})", params)  # noqa: S608
+    autocomplete.invalidate()
+    return archived
+
+
+def restore(isbn):
+    """Moves the book with this ISBN back to the books table. Returns False if it is not archived."""
+    return bool(restore_many([isbn]))
@@ -0,0 +1,76 @@
+"""
+Prefix search for the search box, which sends a request per keystroke.
+
+Titles and authors are matched case-insensitively against `LOWER(column) COLLATE "C"` expression indexes.
+With the C collation, the index serves both the prefix filter (LIKE 'prefix%') and the alphabetical order, so the top
+matches are a range scan that stops after `limit` rows, however many books match. Authors are looked up in
+BookCountByAuthor (see books/stats.py), which has each author once.
+
+Results are kept in an in-process LRU cache, so popular prefixes don't reach the database. Every book write bumps a
+version number in the Django cache, and cached results from older versions are never read again, so all processes
+see the writes as soon as they are done.
+"""
+
+import time
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.db.models.functions import Collate, Lower
+
+from books.models import Book, BookCountByAuthor
+
+VERSION_KEY = "autocomplete-version"
+FIELDS = ("title", "author")
+CACHE_SIZE = 4096
+
+
+def prefix_key(field):
+    """The expression of the prefix indexes."""
+    return Collate(Lower(field), "C")
+
+
+def normalize_prefix(prefix):
+    # Trailing spaces are kept, "lord " shouldn't match "lordship"
+    return prefix.lstrip().lower()
+
+
+def matches(field, prefix, limit):
+    """Returns the first `limit` titles or authors, in alphabetical order, starting with `prefix`."""
+    if field == "title":
+        queryset, columns = Book.objects.all(), ("isbn", "title")
+    else:
+        queryset, columns = BookCountByAuthor.objects.filter(books__gt=0), ("author", "books")
+    return tuple(
+        queryset.annotate(key=prefix_key(field))
+        .filter(key__startswith=normalize_prefix(prefix))
+        .order_by("key")
+        .values(*columns)[:limit]
+    )
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _cached_matches(field, prefix, limit, version):
+    # The version is only part of the cache key
+    return matches(field, prefix, limit)
+
+
+def cached_matches(field, prefix, limit):
+    """Same as matches(), but served from the in-process cache while no book is written."""
+    if (version := cache.get(VERSION_KEY)) is None:
+        cache.add(VERSION_KEY, new_version(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return _cached_matches(field, normalize_prefix(prefix), limit, version)
+
+
+def new_version():
+    # If the version is evicted, starting again from 1 could bring back results cached under an old version
+    return time.time_ns()
+
+
+def invalidate():
+    """Makes every process forget its cached matches. Called when a book is written."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # The version is not set yet, or was evicted
+        cache.set(VERSION_KEY, new_version(), timeout=None)
@@ -0,0 +1,170 @@
+"""
+Bloom filter of the ISBNs in the catalog, kept in Redis, so detail requests for ISBNs that don't exist get a 404
+without querying Postgres. Scanners and external links ask for a lot of those, and 404s are not cached.
+
+The filter answers "definitely not in the catalog" or "maybe in the catalog". It is sized for
+settings.ISBN_BLOOM_FILTER_CAPACITY books with a false positive rate of settings.ISBN_BLOOM_FILTER_ERROR_RATE, and
+false positives only cost the database query they would have cost anyway. Each check or insert is one BITFIELD
+command, so one round trip to Redis.
+
+Books are added when they are created (see books/signals.py). Bloom filters can't remove items, so deleted books stay
+in the filter as false positives, and deletes are only counted. `python manage.py rebuild_isbn_bloom_filter` builds the
+filter from the books table and the archive; it should run after bulk inserts, and from time to time if there are many deletes.
+
+Until the filter is built, or if Redis is unavailable, every ISBN is "maybe in the catalog". So are the ISBNs a
+process could not add because of a Redis error: they are kept in memory, and added again with the next ISBN added or
+checked, until it succeeds. Only a process that exits before then leaves them out of the filter until it is rebuilt,
+which is logged.
+"""
+
+import hashlib
+import logging
+import math
+from datetime import timedelta
+from itertools import chain, islice
+
+import redis
+from django.conf import settings
+from django.utils import timezone
+
+from books.models import ArchivedBook, Book
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 10_000
+# Books created while the filter is rebuilt may not be in it, so they are added again after it is swapped in.
+# The margin covers transactions that were still open when the rebuild started
+REBUILD_MARGIN = timedelta(minutes=5)
+
+_client = None
+# ISBNs this process could not add to the filter, see add()
+_unadded = set()
+
+
+def get_client():
+    global _client  # noqa: PLW0603
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.ISBN_BLOOM_FILTER_REDIS_URL, socket_timeout=0.2, socket_connect_timeout=0.2
+        )
+    return _client
+
+
+def filter_size(capacity, error_rate):
+    """Returns the optimal number of bits and of hash functions for the given capacity and false positive rate."""
+    bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, hashes
+
+
+def filter_key():
+    bits, hashes = filter_size(settings.ISBN_BLOOM_FILTER_CAPACITY, settings.ISBN_BLOOM_FILTER_ERROR_RATE)
+    # Changing the size makes a new filter, the bits of the old one would not mean the same thing
+    return f"isbn-bloom:{bits}:{hashes}", bits, hashes
+
+
+def bit_positions(isbn, bits, hashes):
+    # Double hashing: the k positions are derived from two hashes instead of computing k hashes
+    digest = hashlib.blake2b(isbn.encode(), digest_size=16).digest()
+    first, second = int.from_bytes(digest[:8]), int.from_bytes(digest[8:]) | 1
+    return [(first + index * second) % bits for index in range(hashes)]
+
+
+def might_contain(isbn):
+    """
+    Returns False if `isbn`, in its canonical form, is definitely not in the catalog.
+    Returns True if it may be, if the filter is not built yet or if Redis is unavailable.
+    """
+    if _unadded:
+        _add_unadded()
+        if isbn in _unadded:
+            return True
+    key, bits, hashes = filter_key()
+    command = ["BITFIELD", key]
+    for position in bit_positions(isbn, bits, hashes):
+        command.extend(("GET", "u1", position))
+    try:
+        with get_client().pipeline(transaction=False) as pipeline:
+            pipeline.exists(key)
+            pipeline.execute_command(*command)
+            exists, values = pipeline.execute()
+    except redis.RedisError:
+        logger.warning("ISBN Bloom filter is unavailable, looking the book up", exc_info=True)
+        return True
+    return not exists or all(values)
+
+
+def _set_bits(key, isbns, bits, hashes):
+    command = ["BITFIELD", key]
+    for isbn in isbns:
+        for position in bit_positions(isbn, bits, hashes):
+            command.extend(("SET", "u1", position, 1))
+    get_client().execute_command(*command)
+
+
+def _add(isbns):
+    key, bits, hashes = filter_key()
+    if get_client().exists(key):
+        _set_bits(key, isbns, bits, hashes)
+    _unadded.difference_update(isbns)
+
+
+def _add_unadded():
+    try:
+        _add(list(_unadded))
+    except redis.RedisError:
+        logger.warning("Could not add %d ISBNs to the Bloom filter, will retry", len(_unadded), exc_info=True)
+
+
+def add(isbn):
+    """
+    Adds `isbn`, in its canonical form, to the filter, if the filter is built. If Redis fails, the ISBN is "maybe in
+    the catalog" for this process until it is added.
+    """
+    try:
+        _add([isbn, *_unadded])
+    except redis.RedisError:
+        _unadded.add(isbn)
+        # Other processes can't find the book through the filter until it is added, or the filter rebuilt
+        logger.exception("Could not add ISBN %s to the Bloom filter, will retry", isbn)
+
+
+def record_delete(count=1):
+    key, _, _ = filter_key()
+    try:
+        get_client().incrby(f"{key}:deletes", count)
+    except redis.RedisError:
+        logger.warning("Could not count a delete in the ISBN Bloom filter", exc_info=True)
+
+
+def deletes_since_rebuild():
+    key, _, _ = filter_key()
+    return int(get_client().get(f"{key}:deletes") or 0)
+
+
+def rebuild():
+    """Builds the filter from the books table and the archive, then swaps it in. Returns the number of ISBNs added."""
+    key, bits, hashes = filter_key()
+    new_key = f"{key}:rebuilding"
+    started_at = timezone.now()
+    client = get_client()
+    client.delete(new_key)
+    # Creates the key even if there are no books, so the filter counts as built
+    client.setbit(new_key, bits - 1, 0)
+    count = 0
+    # Archived books can still be looked up, see books/archive.py
+    isbns = chain.from_iterable(
+        model.objects.values_list("isbn", flat=True).iterator(chunk_size=BATCH_SIZE) for model in (Book, ArchivedBook)
+    )
+    while batch := list(islice(isbns, BATCH_SIZE)):
+        _set_bits(new_key, batch, bits, hashes)
+        count += len(batch)
+    with client.pipeline() as pipeline:
+        pipeline.rename(new_key, key)
+        pipeline.delete(f"{key}:deletes")
+        pipeline.execute()
+
+    recent = Book.objects.filter(created_at__gte=started_at - REBUILD_MARGIN).values_list("isbn", flat=True)
+    for isbn in recent.iterator(chunk_size=BATCH_SIZE):
+        add(isbn)
+    return count
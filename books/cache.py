@@ -0,0 +1,138 @@
+"""
+Cache backends used by the project.
+They are thin wrappers around Django's own backends that record timings and hit/miss information
+through books.instrumentation, so they behave exactly like the backends they extend.
+
+ShardedRedisCache spreads the keys over several Redis nodes instead of using the extra locations as replicas, so the
+cache can grow past the memory and throughput of one Redis. Keys are placed with consistent hashing: adding a node
+only moves the keys that land on it, about 1/n of them, instead of remapping almost every key.
+"""
+
+import hashlib
+import time
+from bisect import bisect
+from collections import defaultdict
+
+from django.core.cache.backends.redis import RedisCache, RedisCacheClient
+
+from books import instrumentation
+
+_MISSING = object()
+
+
+class InstrumentedCacheMixin:
+    """Records the duration of get/set/delete calls and whether each get was a hit or a miss."""
+
+    def get(self, key, default=None, version=None):
+        start = time.perf_counter()
+        value = super().get(key, _MISSING, version)  # type: ignore[misc]
+        instrumentation.record(
+            "cache-get", time.perf_counter() - start, outcome="miss" if value is _MISSING else "hit"
+        )
+        return default if value is _MISSING else value
+
+    def set(self, key, value, timeout=None, version=None):
+        with instrumentation.timer("cache-set"):
+            return super().set(key, value, timeout, version)  # type: ignore[misc]
+
+    def delete(self, key, version=None):
+        with instrumentation.timer("cache-delete"):
+            return super().delete(key, version)  # type: ignore[misc]
+
+
+class InstrumentedRedisCache(InstrumentedCacheMixin, RedisCache):
+    pass
+
+
+class HashRing:
+    """
+    Consistent hashing ring. Each node is placed at `points_per_node` points of the ring, and a key belongs to the
+    first node point after the key's hash, so the keys are spread evenly and each node only takes keys from others.
+    """
+
+    def __init__(self, nodes, points_per_node=160):
+        points = sorted(
+            (self.hash(f"{node}#{point}"), index)
+            for index, node in enumerate(nodes)
+            for point in range(points_per_node)
+        )
+        self._hashes = [point_hash for point_hash, _ in points]
+        self._nodes = [index for _, index in points]
+
+    @staticmethod
+    def hash(value):
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest())
+
+    def node_index(self, key):
+        """Returns the index, in the list given to the ring, of the node that holds `key`."""
+        return self._nodes[bisect(self._hashes, self.hash(key)) % len(self._hashes)]
+
+
+class ShardedRedisCacheClient(RedisCacheClient):
+    """Sends each key to its node. Commands on several keys are split per node, with one round trip per node."""
+
+    def __init__(self, servers, **options):
+        super().__init__(servers, **options)
+        # The ring is built from the locations, so a node keeps its keys if other nodes are added or removed
+        self._ring = HashRing(servers)
+
+    def _get_node_client(self, index):
+        if index not in self._pools:
+            self._pools[index] = self._pool_class.from_url(self._servers[index], **self._pool_options)
+        return self._client(connection_pool=self._pools[index])
+
+    def _group_by_node(self, keys):
+        groups = defaultdict(list)
+        for key in keys:
+            groups[self._ring.node_index(key)].append(key)
+        return groups
+
+    def get_client(self, key=None, *, write=False):
+        if key is None:
+            msg = "Sharded cache clients need a key to pick the node"
+            raise ValueError(msg)
+        return self._get_node_client(self._ring.node_index(key))
+
+    def get_many(self, keys):
+        values = {}
+        for index, node_keys in self._group_by_node(keys).items():
+            node_values = self._get_node_client(index).mget(node_keys)
+            values.update(
+                (key, self._serializer.loads(value))
+                for key, value in zip(node_keys, node_values, strict=True)
+                if value is not None
+            )
+        return values
+
+    def set_many(self, data, timeout):
+        for index, node_keys in self._group_by_node(data).items():
+            with self._get_node_client(index).pipeline() as pipeline:
+                pipeline.mset({key: self._serializer.dumps(data[key]) for key in node_keys})
+                if timeout is not None:
+                    for key in node_keys:
+                        pipeline.expire(key, timeout)
+                pipeline.execute()
+
+    def delete_many(self, keys):
+        for index, node_keys in self._group_by_node(keys).items():
+            self._get_node_client(index).delete(*node_keys)
+
+    def clear(self):
+        # all() would stop flushing at the first node that returns False
+        results = [self._get_node_client(index).flushdb() for index in range(len(self._servers))]
+        return all(results)
+
+
+class ShardedRedisCache(RedisCache):
+    """
+    Redis cache where every location is a shard, e.g. `"LOCATION": "redis://cache-1:6379/0,redis://cache-2:6379/0"`.
+    Django's RedisCache would use the locations after the first one as read replicas instead.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        self._class = ShardedRedisCacheClient
+
+
+class InstrumentedShardedRedisCache(InstrumentedCacheMixin, ShardedRedisCache):
+    pass
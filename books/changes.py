@@ -0,0 +1,95 @@
+"""
+Change feed, so consumers mirroring the catalog can sync only what changed since their last sync.
+
+Changes are books, ordered by (updated_at, isbn), archived books (see books/archive.py), in the same order, and
+tombstones of deleted books, ordered by (deleted_at, isbn), merged into a single sequence. Each order is served by an
+index, and the cursor is the position of the last change returned, so each page is an index range scan starting at
+the cursor, no matter how far into the feed it is.
+
+Timestamps are set when a row is saved, not when its transaction commits, so a slow transaction could commit a
+change older than one already returned, and a consumer past it would never see it. Likewise, a lagging replica
+could be missing changes older than the ones it returns. So the feed stops settings.CHANGE_FEED_DELAY_SECONDS
+before now, which should be more than the longest write transaction and the replication lag.
+"""
+
+import base64
+import binascii
+import heapq
+import json
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from books.isbn import canonical_isbn
+from books.models import ArchivedBook, Book, BookTombstone
+
+
+@dataclass(frozen=True)
+class Change:
+    changed_at: datetime
+    isbn: str
+    book: Book | None  # None when the book was deleted
+
+    @property
+    def position(self):
+        return self.changed_at, self.isbn
+
+
+def encode_cursor(position):
+    changed_at, isbn = position
+    return base64.urlsafe_b64encode(json.dumps([changed_at.isoformat(), isbn]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Returns the (changed_at, isbn) position in an opaque cursor returned by the feed.
+    Raises ValueError if the cursor is not one.
+    """
+    try:
+        changed_at, isbn = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        changed_at = datetime.fromisoformat(changed_at)
+    except (binascii.Error, UnicodeError, TypeError, ValueError) as error:
+        raise ValueError("Invalid cursor") from error
+    if timezone.is_naive(changed_at) or not isinstance(isbn, str):
+        raise ValueError("Invalid cursor")
+    # A forged ISBN would only fail once the feed is queried
+    return changed_at, canonical_isbn(isbn)
+
+
+def _after(queryset, timestamp_field, position, until):
+    queryset = queryset.filter(**{f"{timestamp_field}__lte": until})
+    if position is not None:
+        changed_at, isbn = position
+        # The first condition is implied by the second, but the OR alone gives the index no lower bound: it is what
+        # makes each page a range scan starting at the cursor, instead of a scan from the start of the feed
+        queryset = queryset.filter(
+            Q(**{f"{timestamp_field}__gte": changed_at}),
+            Q(**{f"{timestamp_field}__gt": changed_at}) | Q(**{timestamp_field: changed_at, "isbn__gt": isbn}),
+        )
+    return queryset.order_by(timestamp_field, "isbn")
+
+
+def changes_after(position, limit, until=None):
+    """
+    Returns the first `limit` changes after `position`, or from the start of the feed if it is None,
+    and whether there are more changes after them.
+    Only changes up to `until` are returned, by default CHANGE_FEED_DELAY_SECONDS before now.
+    """
+    if until is None:
+        until = timezone.now() - timedelta(seconds=settings.CHANGE_FEED_DELAY_SECONDS)
+    books = _after(Book.objects.all(), "updated_at", position, until)
+    archived_books = _after(ArchivedBook.objects.all(), "updated_at", position, until)
+    tombstones = _after(BookTombstone.objects.all(), "deleted_at", position, until)
+    # Each query returns one more row than needed, to know if there is a next page
+    changes = list(
+        heapq.merge(
+            (Change(book.updated_at, book.isbn, book) for book in books[: limit + 1]),
+            (Change(archived.updated_at, archived.isbn, archived.as_book()) for archived in archived_books[: limit + 1]),
+            (Change(tombstone.deleted_at, tombstone.isbn, None) for tombstone in tombstones[: limit + 1]),
+            key=lambda change: change.position,
+        )
+    )
+    return changes[:limit], len(changes) > limit
@@ -0,0 +1,47 @@
+"""
+Helpers to keep responses gzipped, so they can be stored compressed and sent as they are to clients that accept gzip.
+Clients that don't get them decompressed.
+"""
+
+import gzip
+
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+# Like Django's GZipMiddleware, smaller bodies are not worth compressing
+MIN_LENGTH = 200
+
+
+def accepts_gzip(request):
+    """Parses the Accept-Encoding header of `request`, including `gzip;q=0` refusals and `*`."""
+    codings = {}
+    for item in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _, parameters = item.strip().lower().partition(";")
+        quality = 1.0
+        if (parameter := parameters.strip()).startswith("q="):
+            try:
+                quality = float(parameter[2:])
+            except ValueError:
+                quality = 0.0
+        codings[coding.strip()] = quality
+    return codings.get("gzip", codings.get("*", 0.0)) > 0
+
+
+def compress_response(response):
+    """Gzips the body of a response in place, unless it is streamed, already encoded or too small."""
+    if response.streaming or response.has_header("Content-Encoding") or len(response.content) < MIN_LENGTH:
+        return
+    response.content = compress_string(response.content)
+    response["Content-Encoding"] = "gzip"
+    if response.has_header("Content-Length"):
+        response["Content-Length"] = str(len(response.content))
+
+
+def serve_compressed_response(request, response):
+    """Sends a response gzipped by compress_response() as is if the client accepts gzip, or decompressed otherwise."""
+    patch_vary_headers(response, ["Accept-Encoding"])
+    if response.get("Content-Encoding") == "gzip" and not accepts_gzip(request):
+        response.content = gzip.decompress(response.content)
+        del response["Content-Encoding"]
+        if response.has_header("Content-Length"):
+            response["Content-Length"] = str(len(response.content))
@@ -11,29 +11,76 @@ from functools import wraps
 
 from django.conf import settings
 from django.core.cache import caches
-from django.utils.cache import get_cache_key
+from django.http import HttpRequest
+from django.urls import reverse
+from django.utils.cache import (
+    _generate_cache_header_key,
+    _generate_cache_key,
+    get_cache_key,
+)
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
 
+from books import metrics
+from books.compression import compress_response, serve_compressed_response
 
-def _invalidate_cache_on_update(cache=None, key_prefix=None):
+
+def _lookup_value(view, kwargs):
+    return kwargs.get(view.lookup_url_kwarg or view.lookup_field)
+
+
+def _canonical_lookup_value(value, normalize_lookup):
+    """Returns the canonical form of a lookup value, or None if it cannot be normalized."""
+    if normalize_lookup is None:
+        return value
+    try:
+        return normalize_lookup(value)
+    except ValueError:
+        return None
+
+
+def _resolve_cache(cache):
+    # Looked up on every call, like cache_page does, since cache handles are per thread and CACHES can be overridden
+    return caches[settings.CACHE_MIDDLEWARE_ALIAS] if cache is None else cache
+
+
+def _detail_request_for(request, path):
+    """Builds a GET request for another path, with the same headers as `request`, to compute its cache key."""
+    detail_request = HttpRequest()
+    detail_request.method = "GET"
+    detail_request.path = detail_request.path_info = path
+    detail_request.META = {**request.META, "QUERY_STRING": ""}
+    return detail_request
+
+
+def _invalidate_cache_on_update(cache=None, key_prefix=None, normalize_lookup=None):
     """
     Decorator that invalidates the cache of a detail view when the object is updated. If no object exists, proceed as usual.
     For cache key, we use the fact that the request path is the same on both update and detail view,
     so we can use Django's key constructor and all the niceties it provides.
+    If the update was made through a non-canonical lookup (see `normalize_lookup`), the canonical URL is invalidated,
+    since that is the only one that gets cached.
     This function is not meant to be used directly.
     """
 
     def inner(method):
         @wraps(method)
         def wrapper(self, request, *args, **kwargs):
-            nonlocal cache
-            if cache is None:
-                cache = caches[settings.CACHE_MIDDLEWARE_ALIAS]
+            detail_cache = _resolve_cache(cache)
+            lookup_value = _lookup_value(self, kwargs)
+            canonical_value = _canonical_lookup_value(lookup_value, normalize_lookup)
+            cache_request = request
+            if canonical_value is not None and canonical_value != lookup_value:
+                resolver_match = request.resolver_match
+                path = reverse(
+                    resolver_match.view_name,
+                    kwargs={**resolver_match.kwargs, self.lookup_url_kwarg or self.lookup_field: canonical_value},
+                )
+                cache_request = _detail_request_for(request, path)
             if cache_key := get_cache_key(
-                request, cache=cache, key_prefix=key_prefix, method="GET"
+                cache_request, cache=detail_cache, key_prefix=key_prefix, method="GET"
             ):
-                cache.delete(cache_key)
+                detail_cache.delete(cache_key)
             return method(self, request, *args, **kwargs)
 
         return wrapper
@@ -41,6 +88,106 @@ def _invalidate_cache_on_update(cache=None, key_prefix=None):
     return inner
 
 
+def _invalidate_cached_details(cache=None, key_prefix=None):
+    """
+    Returns a viewset method that invalidates the cached detail responses of several objects at once,
+    with two cache round trips whatever the number of objects, for views that change objects in bulk.
+    It builds the keys the way `get_cache_key` does, but reads the header keys of all the objects in one go.
+    This function is not meant to be used directly.
+    """
+
+    def invalidate_cached_details(self, request, lookup_values):
+        """Invalidates the cached detail responses of the objects with these (canonical) lookup values."""
+        nonlocal key_prefix
+        detail_cache = _resolve_cache(cache)
+        if key_prefix is None:
+            key_prefix = settings.CACHE_MIDDLEWARE_KEY_PREFIX
+        view_name = f"{self.basename}-detail"
+        if namespace := request.resolver_match.namespace:
+            view_name = f"{namespace}:{view_name}"
+        detail_requests = {}
+        for value in lookup_values:
+            detail_request = _detail_request_for(
+                request, reverse(view_name, kwargs={self.lookup_url_kwarg or self.lookup_field: value})
+            )
+            detail_requests[_generate_cache_header_key(key_prefix, detail_request)] = detail_request
+        header_lists = detail_cache.get_many(detail_requests)
+        detail_cache.delete_many(
+            [
+                _generate_cache_key(detail_requests[header_key], "GET", header_list, key_prefix)
+                for header_key, header_list in header_lists.items()
+            ]
+        )
+
+    return invalidate_cached_details
+
+
+def _compress_before_caching(method):
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        response = method(self, request, *args, **kwargs)
+        # DRF responses are rendered later. This callback is added before cache_page adds the one that stores
+        # the response, so it runs first
+        response.add_post_render_callback(compress_response)
+        return response
+
+    return wrapper
+
+
+def _serve_compressed(request, response):
+    if hasattr(response, "add_post_render_callback"):
+        response.add_post_render_callback(lambda response: serve_compressed_response(request, response))
+    else:
+        # Cache hits are plain, rendered, HttpResponses
+        serve_compressed_response(request, response)
+
+
+def _cache_detail(timeout, cache=None, key_prefix=None, normalize_lookup=None, *, compress=False):
+    """
+    Decorator that caches a detail view with Django's cache_page and counts hits, misses and stale entries.
+    Requests with a query string (e.g. ?fields=) skip the cache: `_invalidate_cache_on_update` only knows the URL
+    of the update request, so it could not invalidate the cached variants.
+    For the same reason, only the canonical URL of an object is cached when there is a `normalize_lookup` function.
+
+    Django's cache middleware flags the request with `_cache_update_cache` when the response was not found in the cache.
+    Stale means the cache still knew the request (its header key exists) but the response itself was gone,
+    which is what happens after `_invalidate_cache_on_update`. That check costs a cache read, but only on misses.
+
+    With `compress`, responses are gzipped before they are stored, which makes them smaller in the cache and on the
+    network. Clients that accept gzip get the stored bytes as they are, the others get them decompressed.
+    The cache key doesn't vary on Accept-Encoding, so there is a single entry per object.
+    This function is not meant to be used directly.
+    """
+
+    def inner(method):
+        cached_method = method_decorator(cache_page(timeout=timeout, cache=cache, key_prefix=key_prefix))(
+            _compress_before_caching(method) if compress else method
+        )
+
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            lookup_value = _lookup_value(self, kwargs)
+            if request.GET or _canonical_lookup_value(lookup_value, normalize_lookup) != lookup_value:
+                metrics.DETAIL_CACHE_LOOKUPS.labels(outcome="bypass").inc()
+                return method(self, request, *args, **kwargs)
+
+            response = cached_method(self, request, *args, **kwargs)
+            if not getattr(request, "_cache_update_cache", False):
+                outcome = "hit"
+            elif get_cache_key(request, cache=_resolve_cache(cache), key_prefix=key_prefix, method="GET"):
+                outcome = "stale"
+            else:
+                outcome = "miss"
+            metrics.DETAIL_CACHE_LOOKUPS.labels(outcome=outcome).inc()
+            if compress:
+                _serve_compressed(request, response)
+            return response
+
+        return wrapper
+
+    return inner
+
+
 # def _cache_retrieval(timeout=60 * 5, cache=None, key_prefix=None):
 #     """
 #     This is a method decorator that caches the result of a method call for a given timeout.
@@ -73,23 +220,33 @@ def _attach_decorator_to_methods(new_method, method_names=None):
     return class_decorator
 
 
-def viewset_cache_detail_with_reset_on_update(timeout, cache=None, key_prefix=None):
+def viewset_cache_detail_with_reset_on_update(
+    timeout, cache=None, key_prefix=None, normalize_lookup=None, *, compress=False
+):
     """
     This function returns a decorator meant to be used on modelviewsets that cache the results of GET requests and invalidates the cache on PUT and PATCH requests.
+    If the same object can be looked up by several values (e.g. ISBN-10 and ISBN-13), `normalize_lookup` must return the
+    canonical one. It may raise ValueError for values that cannot be normalized.
+    The viewset also gets an `invalidate_cached_details(request, lookup_values)` method, for actions that change
+    several objects at once.
+    With `compress`, responses are stored gzipped and sent as they are to clients that accept gzip.
     """
 
     def decorator(cls):
         # Decorators for PUT and PATCH requests
         cls = _attach_decorator_to_methods(
-            _invalidate_cache_on_update(cache=cache, key_prefix=key_prefix),
+            _invalidate_cache_on_update(cache=cache, key_prefix=key_prefix, normalize_lookup=normalize_lookup),
             method_names=["update", "partial_update"],
         )(cls)
         # Decorator for GET requests. We leverage django's cache_page decorator.
-        cls = method_decorator(
-            cache_page(timeout=timeout, cache=cache, key_prefix=key_prefix),
-            name="retrieve",
+        cls = _attach_decorator_to_methods(
+            _cache_detail(
+                timeout=timeout, cache=cache, key_prefix=key_prefix, normalize_lookup=normalize_lookup, compress=compress
+            ),
+            method_names=["retrieve"],
         )(cls)
+        cls.invalidate_cached_details = _invalidate_cached_details(cache=cache, key_prefix=key_prefix)
 
-        return cls  # noqa: RET504
+        return cls
 
     return decorator
@@ -0,0 +1,110 @@
+"""
+Lightweight per-request performance instrumentation.
+
+A request is either sampled or not. For sampled requests, the middleware in books/middleware.py activates a
+RequestTimings object for the duration of the request and every instrumented block (database queries, cache calls,
+OpenLibrary calls, rendering) adds its duration to it.
+For requests that are not sampled there is no active RequestTimings, so `timer` and `record` are close to a no-op.
+That is what makes it cheap enough to leave on in production with a low sampling rate.
+"""
+
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Metric:
+    """Accumulated duration (in seconds) and number of calls of a single instrumented operation."""
+
+    duration: float = 0.0
+    count: int = 0
+    outcomes: Counter[str] = field(default_factory=Counter)
+
+    def description(self) -> str:
+        if self.outcomes:
+            return ", ".join(f"{amount} {outcome}" for outcome, amount in sorted(self.outcomes.items()))
+        return f"{self.count} call{'s' if self.count != 1 else ''}"
+
+
+class RequestTimings:
+    """Collects the metrics for a single request."""
+
+    def __init__(self) -> None:
+        self.started_at = time.perf_counter()
+        self.metrics: dict[str, Metric] = {}
+
+    def record(self, name: str, duration: float, outcome: str | None = None) -> None:
+        metric = self.metrics.setdefault(name, Metric())
+        metric.duration += duration
+        metric.count += 1
+        if outcome is not None:
+            metric.outcomes[outcome] += 1
+
+    def recorded_duration(self) -> float:
+        """Sum of all durations recorded so far. Used to compute exclusive durations of enclosing blocks."""
+        return sum(metric.duration for metric in self.metrics.values())
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def as_server_timing(self) -> str:
+        """
+        Formats the metrics as a Server-Timing header value, for example:
+        db;dur=3.21;desc="4 calls", cache-get;dur=0.52;desc="1 hit", total;dur=12.80
+        """
+        entries = [
+            f'{name};dur={metric.duration * 1000:.2f};desc="{metric.description()}"'
+            for name, metric in self.metrics.items()
+        ]
+        entries.append(f"total;dur={self.elapsed() * 1000:.2f}")
+        return ", ".join(entries)
+
+    def as_log_data(self) -> dict[str, dict[str, float | int | dict[str, int]]]:
+        data: dict[str, dict[str, float | int | dict[str, int]]] = {
+            name: {"duration_ms": round(metric.duration * 1000, 3), "count": metric.count}
+            for name, metric in self.metrics.items()
+        }
+        for name, metric in self.metrics.items():
+            if metric.outcomes:
+                data[name]["outcomes"] = dict(metric.outcomes)
+        data["total"] = {"duration_ms": round(self.elapsed() * 1000, 3), "count": 1}
+        return data
+
+
+_current_timings: ContextVar[RequestTimings | None] = ContextVar("current_request_timings", default=None)
+
+
+def start_request_timings() -> tuple[RequestTimings, Token[RequestTimings | None]]:
+    timings = RequestTimings()
+    return timings, _current_timings.set(timings)
+
+
+def stop_request_timings(token: Token[RequestTimings | None]) -> None:
+    _current_timings.reset(token)
+
+
+def current_timings() -> RequestTimings | None:
+    return _current_timings.get()
+
+
+def record(name: str, duration: float, outcome: str | None = None) -> None:
+    """Records a measurement on the active request, if it is being sampled."""
+    if (timings := _current_timings.get()) is not None:
+        timings.record(name, duration, outcome)
+
+
+@contextmanager
+def timer(name: str) -> Iterator[None]:
+    """Times the enclosed block and records it on the active request, if it is being sampled."""
+    if _current_timings.get() is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
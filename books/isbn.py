@@ -0,0 +1,120 @@
+"""
+ISBN normalization.
+
+Books are stored under the canonical form of their ISBN: the ISBN-13, digits only. ISBN-10s are converted by adding
+the 978 prefix and computing the ISBN-13 check digit, which is how the two forms of the same book relate.
+Only the check digit of the converted ISBN-10 is computed: the check digits clients send are not validated by the
+API, since there are published books with invalid ISBNs (see `somewhat_validate_isbn` in models.py).
+
+Bulk imports validate whole columns of ISBNs with `validate_isbns`, which can also check the check digits.
+"""
+
+ISBN10_LENGTH = 10
+ISBN13_LENGTH = 13
+
+_SEPARATORS = str.maketrans("", "", "- ")
+
+# Error codes returned by validate_isbns(), one per ISBN
+VALID = 0
+INVALID_LENGTH = 1
+INVALID_CHARACTER = 2
+INVALID_CHECK_DIGIT = 3
+
+ISBN10_WEIGHTS = range(10, 0, -1)
+ISBN13_WEIGHTS = (1, 3) * 6 + (1,)
+
+# Translation tables for validate_isbns(), applied to every character of a column at once. They map each byte to:
+# 0 if it is a digit, 1 otherwise
+_NOT_DIGIT = bytes(0 if chr(byte) in "0123456789" else 1 for byte in range(256))
+# The same, for the last character of ISBN-10s, which can be an X
+_NOT_ISBN10_CHECK_DIGIT = bytes(0 if byte == ord("X") else flag for byte, flag in enumerate(_NOT_DIGIT))
+# Its value times a weight, modulo the modulus of the check digit. X is 10
+_DIGIT_VALUES = {ord(digit): value for value, digit in enumerate("0123456789X")}
+_WEIGHTED = {
+    (weight, modulus): bytes(_DIGIT_VALUES.get(byte, 0) * weight % modulus for byte in range(256))
+    for weights, modulus in ((ISBN10_WEIGHTS, 11), (ISBN13_WEIGHTS, 10))
+    for weight in set(weights)
+}
+# 0 if it is 0, 1 otherwise
+_NOT_ZERO = bytes([0]) + bytes([1]) * 255
+# 0 if it is a multiple of the modulus, 1 otherwise
+_NOT_MULTIPLE = {modulus: bytes(1 if value % modulus else 0 for value in range(256)) for modulus in (10, 11)}
+# The error code of (2 * invalid character + wrong check digit)
+_ERROR_CODES = bytes([VALID, INVALID_CHECK_DIGIT, INVALID_CHARACTER, INVALID_CHARACTER]) + bytes(252)
+
+
+def clean_isbn(isbn: str) -> str:
+    """Removes hyphens and spaces, and upper-cases the X check digit of ISBN-10s."""
+    return isbn.translate(_SEPARATORS).upper()
+
+
+def isbn13_check_digit(first_twelve_digits: str) -> str:
+    total = sum(int(digit) * (3 if position % 2 else 1) for position, digit in enumerate(first_twelve_digits))
+    return str(-total % 10)
+
+
+def isbn10_to_isbn13(isbn10: str) -> str:
+    first_twelve_digits = "978" + isbn10[:9]
+    return first_twelve_digits + isbn13_check_digit(first_twelve_digits)
+
+
+def canonical_isbn(isbn: str) -> str:
+    """
+    Returns the canonical (ISBN-13) form of an ISBN-10 or ISBN-13, with or without hyphens.
+    Raises ValueError if the value does not have the shape of an ISBN.
+    """
+    isbn = clean_isbn(isbn)
+    if len(isbn) == ISBN13_LENGTH and isbn.isascii() and isbn.isdigit():
+        return isbn
+    if len(isbn) == ISBN10_LENGTH and isbn.isascii() and isbn[:-1].isdigit() and isbn[-1] in "0123456789X":
+        return isbn10_to_isbn13(isbn)
+    raise ValueError(f"{isbn!r} is not an ISBN-10 or an ISBN-13")
+
+
+def _validate_column(isbns, length, *, strict):
+    """
+    Validates ISBNs that all have `length` characters. Each character position is sliced out of the concatenated ISBNs
+    and translated, and the per-ISBN sums of a position are added as the bytes of one big integer: every byte stays
+    below 256, so there are no carries between ISBNs. The work per ISBN is done in C, without a Python loop.
+    """
+    count = len(isbns)
+    # Non-ASCII characters become "?", so each character is still one byte
+    data = "".join(isbns).encode("ascii", "replace")
+    weights, modulus = (ISBN10_WEIGHTS, 11) if length == ISBN10_LENGTH else (ISBN13_WEIGHTS, 10)
+    invalid_characters = check_sums = 0
+    for position, weight in enumerate(weights):
+        column = data[position::length]
+        allowed = _NOT_ISBN10_CHECK_DIGIT if length == ISBN10_LENGTH and position == length - 1 else _NOT_DIGIT
+        invalid_characters += int.from_bytes(column.translate(allowed))
+        if strict:
+            check_sums += int.from_bytes(column.translate(_WEIGHTED[weight, modulus]))
+    invalid_characters = int.from_bytes(invalid_characters.to_bytes(count).translate(_NOT_ZERO))
+    wrong_check_digits = int.from_bytes(check_sums.to_bytes(count).translate(_NOT_MULTIPLE[modulus]))
+    return (2 * invalid_characters + wrong_check_digits).to_bytes(count).translate(_ERROR_CODES)
+
+
+def validate_isbns(isbns, *, strict=False):
+    """
+    Validates a column of ISBNs at once, for bulk imports. Returns one error code per ISBN (VALID, INVALID_LENGTH,
+    INVALID_CHARACTER or INVALID_CHECK_DIGIT), as bytes: `codes[i]` is the code of `isbns[i]`.
+
+    Hyphens and spaces are ignored. The lenient mode accepts the same ISBNs as `somewhat_validate_isbn`: 9 digits
+    followed by a digit or an X, or 13 digits. The strict mode also checks the check digits of ISBN-10s (modulo 11)
+    and ISBN-13s (modulo 10).
+    """
+    isbns = list(isbns)
+    # Cleaned all at once, unless an ISBN contains the line break that separates them
+    cleaned = clean_isbn("\n".join(isbns)).split("\n")
+    if len(cleaned) != len(isbns):
+        cleaned = [clean_isbn(isbn) for isbn in isbns]
+    lengths = set(map(len, cleaned))
+    # Imports usually have a single kind of ISBN
+    if len(lengths) == 1 and (length := lengths.pop()) in (ISBN10_LENGTH, ISBN13_LENGTH):
+        return _validate_column(cleaned, length, strict=strict)
+    codes = bytearray([INVALID_LENGTH]) * len(cleaned)
+    for length in (ISBN10_LENGTH, ISBN13_LENGTH):
+        indexes = [index for index, isbn in enumerate(cleaned) if len(isbn) == length]
+        column_codes = _validate_column([cleaned[index] for index in indexes], length, strict=strict)
+        for index, code in zip(indexes, column_codes, strict=True):
+            codes[index] = code
+    return bytes(codes)
@@ -0,0 +1,25 @@
+# ruff: noqa: T201
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from books import archive
+
+
+class Command(BaseCommand):
+    help = "Moves the books that were not updated for a while out of the books table, into the archive. Detail requests still find them. It works in small batches, so it can run while the API is serving requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="Archive the books not updated for this many days. Defaults to the ARCHIVE_AFTER_DAYS setting.")
+        parser.add_argument("--batch_size", type=int, default=archive.BATCH_SIZE, help="How many books to move in each transaction.")
+        parser.add_argument("--pause", type=float, default=0.1, help="Seconds to wait between batches, to leave room for other queries.")
+
+    def handle(self, *args, **options):
+        days = options["days"] if options["days"] is not None else settings.ARCHIVE_AFTER_DAYS
+        print(f"Archiving the books not updated for {days} days. This may take a while...")
+        count = archive.archive(
+            days,
+            batch_size=options["batch_size"],
+            pause=options["pause"],
+            progress=lambda total: print(f"{total} books archived so far"),
+        )
+        print(f"Successfully archived {count} books.")
@@ -0,0 +1,62 @@
+# ruff: noqa: T201
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router
+
+from books import partitioning
+from books.models import Book
+
+MB = 1024 * 1024
+
+
+class Command(BaseCommand):
+    help = "Reports the size of the books table and of its indexes, and the latency of detail lookups and list pages, to compare the partitioned and unpartitioned layouts (Postgres only). Populate the database with populate_db_with_fake_books first."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lookups", type=int, help="How many detail lookups to time. Default is 1000.")
+        parser.add_argument("--pages", help="Comma separated list pages to time, 10 books per page. Default is 1,1000,100000.")
+        parser.add_argument("--repeat", type=int, help="How many times to time each list page. Default is 20.")
+
+    def handle(self, *args, **options):
+        lookups = options["lookups"] if options["lookups"] else 1000
+        pages = [int(page) for page in (options["pages"] or "1,1000,100000").split(",")]
+        repeat = options["repeat"] if options["repeat"] else 20
+        using = router.db_for_write(Book)
+        if connections[using].vendor != "postgresql":
+            raise CommandError("This command needs Postgres.")
+
+        table = Book._meta.db_table  # noqa: SLF001
+        with connections[using].cursor() as cursor:
+            count, table_size, indexes_size = partitioning.relation_sizes(cursor, table)
+            # A random sample without scanning the table
+            cursor.execute(f"SELECT isbn FROM {table} TABLESAMPLE SYSTEM (1) LIMIT %s", [lookups])  # noqa: S608
+            isbns = [isbn for (isbn,) in cursor.fetchall()]
+        books = Book.objects.using(using)
+        print(f"Books: {books.count()}, in {count} table(s)")
+        print(f"Table size: {table_size / MB:.0f} MB, indexes size: {indexes_size / MB:.0f} MB")
+        if not isbns:
+            print("The table is empty, nothing to time.")
+            return
+
+        print(f"Detail lookups: {self.describe([self.time(lambda isbn=isbn: books.get(isbn=isbn)) for isbn in isbns])}")
+        for page in pages:
+            offset = (page - 1) * 10
+            timings = [self.time(lambda offset=offset: list(books.order_by("created_at")[offset : offset + 10])) for _ in range(repeat)]
+            print(f"List page {page}: {self.describe(timings)}")
+        # Shows which partitions a lookup reads: only one when pruning applies
+        print(books.filter(isbn=isbns[0]).explain())
+
+    @staticmethod
+    def time(function):
+        start = time.perf_counter()
+        function()
+        return time.perf_counter() - start
+
+    @staticmethod
+    def describe(timings):
+        if len(timings) < 2:  # noqa: PLR2004
+            return f"{timings[0] * 1000:.2f}ms"
+        percentiles = statistics.quantiles(timings, n=100)
+        return f"p50 {percentiles[49] * 1000:.2f}ms, p95 {percentiles[94] * 1000:.2f}ms, p99 {percentiles[98] * 1000:.2f}ms"
@@ -0,0 +1,59 @@
+# ruff: noqa: T201
+import time
+
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from books.middleware import FullStackMiddleware
+from books.negotiation import APIModeContentNegotiation
+
+
+class Command(BaseCommand):
+    help = "Measures the per-request time spent in the middleware and content negotiation that API mode skips on /books/ requests. It does not need a database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, help="How many requests to time for each mode. Default is 20000.")
+
+    def handle(self, *args, **options):
+        amount = options["requests"] if options["requests"] else 20_000
+
+        results = {}
+        for api_mode in (False, True):
+            with override_settings(API_MODE=api_mode):
+                results[api_mode] = self.time_requests(amount)
+            label = "API mode" if api_mode else "Full stack"
+            print(f"{label}: {results[api_mode] * 1_000_000:.1f}µs per request")
+
+        saved = results[False] - results[True]
+        print(f"Saved by API mode: {saved * 1_000_000:.1f}µs per request ({saved / results[False]:.0%})")
+
+    @staticmethod
+    def time_requests(amount):
+        """
+        Runs `amount` GET /books/ requests through FullStackMiddleware and content negotiation, the way Django and DRF
+        call them, with a view that does nothing. The requests are built before timing.
+        """
+        negotiator = APIModeContentNegotiation()
+        renderers = [JSONRenderer()]
+
+        def view(request):
+            return HttpResponse("{}", content_type="application/json")
+
+        def handler(request):
+            # Django calls process_view after the middleware chain, right before the view
+            if (response := middleware.process_view(request, view, (), {})) is not None:
+                return response
+            negotiator.select_renderer(Request(request), renderers)
+            return view(request)
+
+        middleware = FullStackMiddleware(handler)
+        factory = RequestFactory()
+        requests = [factory.get("/books/", headers={"accept": "application/json"}) for _ in range(amount)]
+
+        start = time.perf_counter()
+        for request in requests:
+            middleware(request)
+        return (time.perf_counter() - start) / amount
@@ -0,0 +1,31 @@
+# ruff: noqa: T201
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+
+from books import partitioning
+from books.models import Book
+
+
+class Command(BaseCommand):
+    help = "Converts the books table to a table partitioned by hash of the ISBN (Postgres only). It copies every row while the table is locked, so run it in a maintenance window."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--partitions", type=int, help="Number of partitions. Defaults to the BOOKS_TABLE_PARTITIONS setting.")
+
+    def handle(self, *args, **options):
+        partitions = options["partitions"] if options["partitions"] else settings.BOOKS_TABLE_PARTITIONS
+        if partitions < 2:  # noqa: PLR2004
+            raise CommandError("Pass --partitions or set DJANGO_BOOKS_TABLE_PARTITIONS to 2 or more.")
+        using = router.db_for_write(Book)
+        if connections[using].vendor != "postgresql":
+            raise CommandError("Partitioning needs Postgres.")
+
+        table = Book._meta.db_table  # noqa: SLF001
+        with transaction.atomic(using=using), connections[using].cursor() as cursor:
+            if partitioning.is_partitioned(cursor, table):
+                print(f"{table} is already partitioned.")
+                return
+            print(f"Copying {table} into {partitions} partitions. This may take a while...")
+            partitioning.partition_by_hash(cursor, table, Book._meta.pk.column, partitions)  # noqa: SLF001
+        print(f"Successfully partitioned {table}.")
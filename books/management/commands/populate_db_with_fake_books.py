@@ -4,6 +4,8 @@ from django.utils.dateparse import parse_date
 from faker import Faker
 from tqdm import tqdm
 
+from books import bloom, stats
+from books.isbn import VALID, validate_isbns
 from books.models import Book
 
 
@@ -14,6 +16,8 @@ class Command(BaseCommand):
         parser.add_argument("--amount", type=int, help="The number of fake books that should be created.")
         parser.add_argument("--bulk_count", type=int, help="How many books to insert in a single bulk insert. Must be a divider of amount.")
         parser.add_argument("--seed", type=int, help="Seed for Faker instance")
+        parser.add_argument("--lenient_isbns", action="store_true", help="Only check the length and characters of the ISBNs, not their check digits.")
+        parser.add_argument("--invalid_isbns", choices=["reject", "flag"], default="reject", help="Whether books with invalid ISBNs are skipped (the default) or inserted and counted.")
 
     def handle(self, *args, **options):
         amount = options["amount"] if options["amount"] else 2_000_000
@@ -33,6 +37,7 @@ class Command(BaseCommand):
         # Create `amount` of books
         print("Moving onto creation of purchases. This may take a while...")
         bulk_count = 10_000
+        invalid_count = 0
         for _ in tqdm(range(0, amount, bulk_count)):
             books = [
                 Book(
@@ -44,6 +49,19 @@ class Command(BaseCommand):
                 )
                 for _ in range(bulk_count)
             ]
+            codes = validate_isbns([book.isbn for book in books], strict=not options["lenient_isbns"])
+            if invalid := len(books) - codes.count(VALID):
+                invalid_count += invalid
+                if options["invalid_isbns"] == "reject":
+                    books = [book for book, code in zip(books, codes, strict=True) if code == VALID]
             Book.objects.bulk_create(books)
+        if invalid_count:
+            action = "Skipped" if options["invalid_isbns"] == "reject" else "Inserted"
+            print(f"{action} {invalid_count} books with invalid ISBNs")
 
+        # bulk_create skips the signals that keep the statistics and the ISBN Bloom filter up to date
+        print("Counting the catalog statistics...")
+        stats.rebuild()
+        print("Building the ISBN Bloom filter...")
+        bloom.rebuild()
         print("Successfully populated the database.")
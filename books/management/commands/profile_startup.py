@@ -0,0 +1,70 @@
+# ruff: noqa: T201
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books.startup import child_pids, import_times, process_memory
+
+MB = 1024 * 1024
+
+# Runs in a new interpreter, so every import is counted
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+from books.startup import process_memory, warm_up
+print(time.perf_counter() - start, process_memory()["rss"])
+if {warm_up}:
+    start = time.perf_counter()
+    warm_up()
+    print(time.perf_counter() - start, process_memory()["rss"])
+"""
+
+
+class Command(BaseCommand):
+    help = "Reports how long a new process takes to load the application, the import time per package and its memory. With --gunicorn_pid, reports the memory of each worker of a running gunicorn instead. Linux only."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, help="How many packages to list, slowest first. Default is 20.")
+        parser.add_argument("--warm_up", action="store_true", help="Also time the warm up done before forking when GUNICORN_PRELOAD=True.")
+        parser.add_argument("--gunicorn_pid", type=int, help="PID of a gunicorn master process.")
+
+    def handle(self, *args, **options):
+        if options["gunicorn_pid"]:
+            self.report_workers(options["gunicorn_pid"])
+            return
+
+        result = subprocess.run(  # noqa: S603
+            [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT.format(warm_up=options["warm_up"])],
+            capture_output=True,
+            text=True,
+            env=os.environ,
+            check=False,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr)
+        timings = [line.split() for line in result.stdout.splitlines()]
+        seconds, rss = timings[0]
+        print(f"Startup: {float(seconds):.2f}s, RSS {int(rss) / MB:.0f} MB")
+        if options["warm_up"]:
+            seconds, rss = timings[1]
+            print(f"Warm up: {float(seconds):.2f}s, RSS {int(rss) / MB:.0f} MB")
+
+        print("Import time per package:")
+        for package, microseconds in import_times(result.stderr.splitlines()).most_common(options["top"] or 20):
+            print(f"  {package:<30} {microseconds / 1000:8.1f}ms")
+
+    @staticmethod
+    def report_workers(master_pid):
+        print(f"{'':<16} {'RSS':>8} {'PSS':>8} {'Private':>8} {'Shared':>8}")
+        for label, pid in [("master", master_pid)] + [(f"worker {pid}", pid) for pid in child_pids(master_pid)]:
+            memory = process_memory(pid)
+            print(
+                f"{label:<16} {memory['rss'] / MB:6.0f}MB {memory['pss'] / MB:6.0f}MB "
+                f"{memory['private'] / MB:6.0f}MB {(memory['rss'] - memory['private']) / MB:6.0f}MB"
+            )
@@ -0,0 +1,13 @@
+# ruff: noqa: T201
+from django.core.management.base import BaseCommand
+
+from books import stats
+
+
+class Command(BaseCommand):
+    help = "Recounts the catalog statistics served by /books/stats/ from the books table and the archive. Run it after writes that skip model signals, like bulk inserts."
+
+    def handle(self, *args, **options):
+        print("Recounting books per author and per year. This scans the whole books table and may take a while...")
+        stats.rebuild()
+        print("Successfully rebuilt the catalog statistics.")
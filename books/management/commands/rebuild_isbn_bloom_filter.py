@@ -0,0 +1,14 @@
+# ruff: noqa: T201
+from django.core.management.base import BaseCommand
+
+from books import bloom
+
+
+class Command(BaseCommand):
+    help = "Builds the Bloom filter of the ISBNs in the catalog from the books table and the archive, used to answer 404s without querying the database. Run it after bulk inserts and when many books were deleted."
+
+    def handle(self, *args, **options):
+        print(f"Books deleted since the last rebuild: {bloom.deletes_since_rebuild()}")
+        print("Adding every ISBN to a new Bloom filter. This may take a while...")
+        count = bloom.rebuild()
+        print(f"Successfully rebuilt the ISBN Bloom filter with {count} books.")
@@ -0,0 +1,59 @@
+"""
+Prometheus metrics for the hot paths of the API, exported in text format by `metrics_view`.
+
+Gunicorn runs several worker processes, each with its own copy of these metrics.
+When the PROMETHEUS_MULTIPROC_DIR environment variable is set, prometheus_client writes the metrics of every worker
+to that directory and `metrics_view` aggregates all of them, so whichever worker answers the scrape reports the
+totals for the whole server. See gunicorn.conf.py for the cleanup of metrics from dead workers.
+"""
+
+import os
+
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+REQUEST_LATENCY = Histogram(
+    "books_request_duration_seconds",
+    "Latency of the API requests, per viewset action.",
+    ["action", "method", "status"],
+)
+DETAIL_CACHE_LOOKUPS = Counter(
+    "books_detail_cache_lookups_total",
+    "Detail cache lookups. Stale means the entry was invalidated by an update (or evicted) before it expired, "
+    "bypass means the request has a query string and is not cached.",
+    ["outcome"],
+)
+OPENLIBRARY_REQUESTS = Histogram(
+    "books_openlibrary_request_duration_seconds",
+    "Latency of the OpenLibrary API calls, per outcome (success, empty or the exception raised).",
+    ["outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5),
+)
+DB_QUERIES = Histogram(
+    "books_db_queries_per_request",
+    "Number of database queries executed per request, per viewset action.",
+    ["action"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+PAGINATION_DEPTH = Histogram(
+    "books_pagination_page_number",
+    "Page number requested on paginated list requests. Deep pages are the expensive ones.",
+    buckets=(1, 2, 5, 10, 50, 100, 1_000, 10_000, 100_000),
+)
+
+
+def metrics_view(request):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,196 @@
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from books import instrumentation, metrics
+from books.routers import pin_reads_to_primary
+
+logger = logging.getLogger(__name__)
+
+
+class ServerTimingMiddleware:
+    """
+    Samples a share of the requests (settings.SERVER_TIMING_SAMPLE_RATE, between 0 and 1) and, for those,
+    times database queries, cache calls, OpenLibrary calls and response rendering.
+    The results are added to the response as a Server-Timing header and logged as a structured log line.
+    This middleware should be the first one in settings.MIDDLEWARE, so the total covers the whole stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample_rate = settings.SERVER_TIMING_SAMPLE_RATE
+        # Sampling does not need a cryptographically secure generator
+        if sample_rate <= 0 or random.random() >= sample_rate:  # noqa: S311
+            return self.get_response(request)
+
+        timings, token = instrumentation.start_request_timings()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self._time_query))
+                response = self.get_response(request)
+        finally:
+            instrumentation.stop_request_timings(token)
+
+        response["Server-Timing"] = timings.as_server_timing()
+        logger.info(
+            "Request timings for %s %s",
+            request.method,
+            request.path,
+            extra={
+                "method": request.method,
+                "path": request.path,
+                "status_code": response.status_code,
+                "timings": timings.as_log_data(),
+            },
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        """
+        DRF responses are rendered after the view returns, so we time the rendering with a post-render callback.
+        Other post-render callbacks (e.g. the cache middleware storing the response) record their own timings,
+        which are discounted from the rendering time.
+        """
+        if (timings := instrumentation.current_timings()) is None:
+            return response
+
+        start = time.perf_counter()
+        recorded_before = timings.recorded_duration()
+
+        def record_render_time(rendered_response):
+            elapsed = time.perf_counter() - start
+            timings.record("render", elapsed - (timings.recorded_duration() - recorded_before))
+
+        response.add_post_render_callback(record_render_time)
+        return response
+
+    @staticmethod
+    def _time_query(execute, sql, params, many, context):
+        with instrumentation.timer("db"):
+            return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Records the latency and the number of database queries of every request handled by a DRF viewset action.
+    Other views (admin, schema, the metrics endpoint itself) are not recorded.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        query_count = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal query_count
+            query_count += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            response = self.get_response(request)
+
+        if action := getattr(request, "viewset_action", None):
+            metrics.REQUEST_LATENCY.labels(
+                action=action, method=request.method, status=response.status_code
+            ).observe(time.perf_counter() - start)
+            metrics.DB_QUERIES.labels(action=action).observe(query_count)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Views generated by a DRF viewset know which action handles each HTTP method
+        if actions := getattr(view_func, "actions", None):
+            request.viewset_action = actions.get(request.method.lower())
+
+
+class ReadYourWritesMiddleware:
+    """
+    Keeps the reads of a client on the primary database for settings.READ_YOUR_WRITES_SECONDS after it writes.
+    Successful writes return the time of the write in the `last_write` cookie and in the X-Last-Write header.
+    Clients that do not keep cookies can send the header back on their next requests instead.
+    See books/routers.py.
+    """
+
+    cookie_name = "last_write"
+    header_name = "X-Last-Write"
+    safe_methods = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        is_write = request.method not in self.safe_methods
+        with pin_reads_to_primary(is_write or self._wrote_recently(request)):
+            response = self.get_response(request)
+
+        if is_write and response.status_code < 400:  # noqa: PLR2004
+            last_write = f"{time.time():.3f}"
+            response.set_cookie(
+                self.cookie_name,
+                last_write,
+                max_age=settings.READ_YOUR_WRITES_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+            response[self.header_name] = last_write
+        return response
+
+    def _wrote_recently(self, request):
+        last_write = request.headers.get(self.header_name) or request.COOKIES.get(self.cookie_name)
+        if not last_write:
+            return False
+        try:
+            seconds_since_write = time.time() - float(last_write)
+        except ValueError:
+            return False
+        return 0 <= seconds_since_write < settings.READ_YOUR_WRITES_SECONDS
+
+
+class FullStackMiddleware:
+    """
+    Runs the middleware in settings.FULL_STACK_MIDDLEWARE (sessions, CSRF, authentication, messages, clickjacking)
+    only for requests that need them.
+    In API mode (settings.API_MODE), requests whose path starts with one of settings.API_MODE_PATH_PREFIXES skip them:
+    the API has no authentication and uses neither sessions nor messages. Admin and docs keep the full stack.
+
+    The middleware are chained like Django chains settings.MIDDLEWARE. Django only supports process_view among the
+    optional hooks of those middleware, so that is the only one forwarded.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.full_stack = get_response
+        self.view_hooks = []
+        for middleware_path in reversed(settings.FULL_STACK_MIDDLEWARE):
+            middleware = import_string(middleware_path)(self.full_stack)
+            if hasattr(middleware, "process_view"):
+                self.view_hooks.insert(0, middleware.process_view)
+            self.full_stack = middleware
+
+    def __call__(self, request):
+        if self._is_api_request(request):
+            return self.get_response(request)
+        return self.full_stack(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self._is_api_request(request):
+            return None
+        for view_hook in self.view_hooks:
+            if (response := view_hook(request, view_func, view_args, view_kwargs)) is not None:
+                return response
+        return None
+
+    @staticmethod
+    def _is_api_request(request):
+        return settings.API_MODE and request.path_info.startswith(tuple(settings.API_MODE_PATH_PREFIXES))
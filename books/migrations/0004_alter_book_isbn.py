@@ -0,0 +1,63 @@
+# Generated by Django 5.1.2 on 2026-10-19 03:20
+
+from collections import Counter
+
+import books.models
+from django.db import migrations
+
+from books.isbn import canonical_isbn
+
+BATCH_SIZE = 1_000
+
+
+def canonicalize_isbns(apps, schema_editor):
+    """
+    Rewrites the ISBNs that are not canonical yet (ISBN-10s, hyphenated values) to their ISBN-13 form,
+    so the column can then be cast to bigint.
+    Rows that are already canonical, which is every row created by populate_db_with_fake_books, are not touched.
+    The regex filter needs a single sequential scan and each rewrite is a primary key lookup.
+
+    The migration stops without changing anything if an ISBN cannot be converted, or if two rows are the same book
+    under different forms. Those rows need to be fixed or merged by hand before migrating.
+    """
+    Book = apps.get_model("books", "Book")
+    non_canonical = list(Book.objects.exclude(isbn__regex=r"^[0-9]{13}$").values_list("isbn", flat=True))
+
+    renames = {}
+    invalid = []
+    for isbn in non_canonical:
+        try:
+            renames[isbn] = canonical_isbn(isbn)
+        except ValueError:
+            invalid.append(isbn)
+    if invalid:
+        raise RuntimeError(f"These ISBNs cannot be converted to ISBN-13, please fix them first: {invalid[:100]}")
+
+    targets = list(renames.values())
+    duplicated = {isbn for isbn, count in Counter(targets).items() if count > 1}
+    for start in range(0, len(targets), BATCH_SIZE):
+        duplicated.update(Book.objects.filter(isbn__in=targets[start:start + BATCH_SIZE]).values_list("isbn", flat=True))
+    if duplicated:
+        raise RuntimeError(
+            f"These ISBNs are stored in more than one form, please merge the books first: {sorted(duplicated)[:100]}"
+        )
+
+    for old_isbn, new_isbn in renames.items():
+        Book.objects.filter(isbn=old_isbn).update(isbn=new_isbn)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_alter_book_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(canonicalize_isbns, migrations.RunPython.noop),
+        # On Postgres, this is ALTER COLUMN ... TYPE bigint USING isbn::bigint, which rewrites the table
+        migrations.AlterField(
+            model_name='book',
+            name='isbn',
+            field=books.models.ISBNField(primary_key=True, serialize=False, validators=[books.models.somewhat_validate_isbn]),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-19 03:27
+
+import books.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_alter_book_isbn'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookTombstone',
+            fields=[
+                ('isbn', books.models.ISBNField(primary_key=True, serialize=False)),
+                ('deleted_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['updated_at', 'isbn'], name='books_book_updated_5630df_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booktombstone',
+            index=models.Index(fields=['deleted_at', 'isbn'], name='books_bookt_deleted_72f813_idx'),
+        ),
+    ]
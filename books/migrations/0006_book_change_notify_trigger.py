@@ -0,0 +1,48 @@
+from django.db import migrations
+
+# Keep in sync with books.streaming.CHANNEL
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION books_book_notify_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('book_changes', json_build_object('op', 'd', 'isbn', OLD.isbn, 'at', clock_timestamp())::text);
+        RETURN OLD;
+    END IF;
+    PERFORM pg_notify('book_changes', json_build_object('op', 'u', 'isbn', NEW.isbn, 'at', NEW.updated_at)::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+CREATE_TRIGGER = """
+CREATE TRIGGER books_book_notify_change
+AFTER INSERT OR UPDATE OR DELETE ON books_book
+FOR EACH ROW EXECUTE FUNCTION books_book_notify_change()
+"""
+
+DROP_TRIGGER = "DROP TRIGGER IF EXISTS books_book_notify_change ON books_book"
+DROP_FUNCTION = "DROP FUNCTION IF EXISTS books_book_notify_change()"
+
+
+def create_trigger(apps, schema_editor):
+    # LISTEN/NOTIFY only exists on Postgres. Elsewhere, the change stream has no events
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_FUNCTION, params=None)
+        schema_editor.execute(CREATE_TRIGGER, params=None)
+
+
+def drop_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_TRIGGER, params=None)
+        schema_editor.execute(DROP_FUNCTION, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_change_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigger, drop_trigger),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.2 on 2026-10-19 03:31
+
+from itertools import islice
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import ExtractYear
+
+
+def count_existing_books(apps, schema_editor):
+    """
+    Fills the statistics tables from the books already there. This is a GROUP BY over the whole books table,
+    the same as `python manage.py rebuild_catalog_stats`.
+    """
+    Book = apps.get_model("books", "Book")
+    BookCountByAuthor = apps.get_model("books", "BookCountByAuthor")
+    BookCountByYear = apps.get_model("books", "BookCountByYear")
+    authors = Book.objects.values("author").annotate(count=Count("*")).order_by()
+    rows = authors.iterator(chunk_size=10_000)
+    while batch := [BookCountByAuthor(author=row["author"], books=row["count"]) for row in islice(rows, 10_000)]:
+        BookCountByAuthor.objects.bulk_create(batch)
+    years = Book.objects.annotate(year=ExtractYear("publication_date")).values("year").annotate(count=Count("*")).order_by()
+    BookCountByYear.objects.bulk_create(BookCountByYear(year=row["year"], books=row["count"]) for row in years)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_book_change_notify_trigger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookCountByYear',
+            fields=[
+                ('year', models.IntegerField(primary_key=True, serialize=False)),
+                ('books', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BookCountByAuthor',
+            fields=[
+                ('author', models.TextField(primary_key=True, serialize=False)),
+                ('books', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-books', 'author'], name='books_bookc_books_9dc3c2_idx')],
+            },
+        ),
+        migrations.RunPython(count_existing_books, migrations.RunPython.noop),
+    ]
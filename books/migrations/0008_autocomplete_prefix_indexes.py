@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-19 03:34
+
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_catalog_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(django.db.models.functions.comparison.Collate(django.db.models.functions.text.Lower('title'), 'C'), name='books_book_title_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookcountbyauthor',
+            index=models.Index(django.db.models.functions.comparison.Collate(django.db.models.functions.text.Lower('author'), 'C'), name='books_author_prefix_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.1.2 on 2026-10-19 03:46
+
+import books.models
+from django.db import migrations, models
+
+# Same as in 0006_book_change_notify_trigger, except that transactions that set books.skip_change_notify, like the
+# moves to and from the archive (see books/archive.py), don't notify: the books didn't change
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION books_book_notify_change() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('books.skip_change_notify', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('book_changes', json_build_object('op', 'd', 'isbn', OLD.isbn, 'at', clock_timestamp())::text);
+        RETURN OLD;
+    END IF;
+    PERFORM pg_notify('book_changes', json_build_object('op', 'u', 'isbn', NEW.isbn, 'at', NEW.updated_at)::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+PREVIOUS_FUNCTION = """
+CREATE OR REPLACE FUNCTION books_book_notify_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('book_changes', json_build_object('op', 'd', 'isbn', OLD.isbn, 'at', clock_timestamp())::text);
+        RETURN OLD;
+    END IF;
+    PERFORM pg_notify('book_changes', json_build_object('op', 'u', 'isbn', NEW.isbn, 'at', NEW.updated_at)::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def replace_function(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_FUNCTION, params=None)
+
+
+def restore_function(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(PREVIOUS_FUNCTION, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_autocomplete_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBook',
+            fields=[
+                ('author', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('description', models.TextField()),
+                ('isbn', books.models.ISBNField(primary_key=True, serialize=False)),
+                ('publication_date', models.DateField()),
+                ('title', models.TextField()),
+                ('archived_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(replace_function, restore_function),
+    ]
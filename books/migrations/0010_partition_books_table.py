@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db import migrations
+
+from books import partitioning
+
+
+def partition_books_table(apps, schema_editor):
+    # Opt-in, see books/partitioning.py. Databases migrated before setting it are converted with
+    # `python manage.py partition_books_table`
+    if schema_editor.connection.vendor != "postgresql" or not settings.BOOKS_TABLE_PARTITIONS:
+        return
+    Book = apps.get_model("books", "Book")
+    with schema_editor.connection.cursor() as cursor:
+        if not partitioning.is_partitioned(cursor, Book._meta.db_table):
+            partitioning.partition_by_hash(
+                cursor, Book._meta.db_table, Book._meta.pk.column, settings.BOOKS_TABLE_PARTITIONS
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_archived_book'),
+    ]
+
+    operations = [
+        # The partitioned table has the same columns, indexes and triggers, so going back needs no change
+        migrations.RunPython(partition_books_table, migrations.RunPython.noop),
+    ]
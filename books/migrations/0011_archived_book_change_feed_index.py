@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-19 04:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_partition_books_table'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedbook',
+            index=models.Index(fields=['updated_at', 'isbn'], name='books_archi_updated_b8cc2e_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+from django.db import migrations
+
+# Same as in 0009_archived_book, except that deletes record their tombstone here, with the timestamp they notify: the
+# id of a delete event is then the position of the tombstone in the change feed, and deletes done with raw SQL get a
+# tombstone too (see books/changes.py)
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION books_book_notify_change() RETURNS trigger AS $$
+DECLARE
+    deleted_at timestamptz;
+BEGIN
+    IF current_setting('books.skip_change_notify', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        deleted_at := clock_timestamp();
+        -- A book can be deleted, created again and deleted again, only the last deletion matters
+        INSERT INTO books_booktombstone (isbn, deleted_at) VALUES (OLD.isbn, deleted_at)
+        ON CONFLICT (isbn) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+        PERFORM pg_notify('book_changes', json_build_object('op', 'd', 'isbn', OLD.isbn, 'at', deleted_at)::text);
+        RETURN OLD;
+    END IF;
+    PERFORM pg_notify('book_changes', json_build_object('op', 'u', 'isbn', NEW.isbn, 'at', NEW.updated_at)::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+PREVIOUS_FUNCTION = """
+CREATE OR REPLACE FUNCTION books_book_notify_change() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('books.skip_change_notify', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('book_changes', json_build_object('op', 'd', 'isbn', OLD.isbn, 'at', clock_timestamp())::text);
+        RETURN OLD;
+    END IF;
+    PERFORM pg_notify('book_changes', json_build_object('op', 'u', 'isbn', NEW.isbn, 'at', NEW.updated_at)::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def replace_function(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_FUNCTION, params=None)
+
+
+def restore_function(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(PREVIOUS_FUNCTION, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_archived_book_change_feed_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(replace_function, restore_function),
+    ]
@@ -1,24 +1,85 @@
-from typing import ClassVar
+from typing import TYPE_CHECKING, ClassVar
 
+from django import forms
 from django.core.exceptions import ValidationError
-from django.db import models
-from django_stubs_ext.db.models import TypedModelMeta
+from django.db import models, router, transaction
+from django.db.models.functions import Collate, Lower
+from django.utils.functional import cached_property
+
+from books.isbn import ISBN13_LENGTH, canonical_isbn, clean_isbn
+
+# django-stubs-ext is a development dependency, the workers don't need to import it
+if TYPE_CHECKING:
+    from django_stubs_ext.db.models import TypedModelMeta
+else:
+    TypedModelMeta = object
 
 
 def somewhat_validate_isbn(isbn: str) -> None:
     """
     This is a very basic validation for ISBN.
     ISBNs do have validation in them (using the last digit), but there are literally published books with invalid ISBNs.
-    So, instead of applying the full validation, we'll just check if the length is 10 or 13.
-    If the length is 10, the last digit can either be a number or an X.
+    So, instead of applying the full validation, we'll just check if the length is 10 or 13, ignoring hyphens and spaces.
+    If the length is 10, the first nine characters must be digits and the last digit can either be a number or an X.
     """
+    isbn = clean_isbn(isbn)
     if len(isbn) not in (10, 13):
         raise ValidationError("ISBN must be 10 or 13 characters long")
-    if len(isbn) == 10 and isbn[-1] not in "0123456789X":  #noqa: PLR2004
-        raise ValidationError("ISBN must end with a number or an X if it's 10 characters long")
-    if len(isbn) == 13 and not isbn.isdigit():  #noqa: PLR2004
+    if len(isbn) == 10 and not (isbn.isascii() and isbn[:-1].isdigit() and isbn[-1] in "0123456789X"):  #noqa: PLR2004
+        raise ValidationError("ISBN must be 9 digits followed by a number or an X if it's 10 characters long")
+    if len(isbn) == 13 and not (isbn.isascii() and isbn.isdigit()):  #noqa: PLR2004
         raise ValidationError("ISBN must be all digits if it's 13 characters long")
 
+
+class ISBNField(models.BigIntegerField):
+    """
+    Stores an ISBN as the integer of its canonical ISBN-13 form (see books/isbn.py).
+    A bigint key makes the primary key index much smaller and faster to compare than text,
+    and ISBN-10s and ISBN-13s of the same book end up in the same row.
+
+    In Python, the value is a string: the canonical ISBN-13 once the book is saved or loaded from the database.
+    Lookups accept ISBN-10s and ISBN-13s, with or without hyphens.
+    """
+
+    description = "ISBN, stored as the integer of its ISBN-13"
+
+    @cached_property
+    def validators(self):
+        # BigIntegerField adds range validators, which don't apply to ISBN strings
+        return [*self.default_validators, *self._validators]
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else f"{value:0{ISBN13_LENGTH}d}"
+
+    def to_python(self, value):
+        if value is None:
+            return value
+        if isinstance(value, int):
+            return f"{value:0{ISBN13_LENGTH}d}"
+        return clean_isbn(str(value))
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None or isinstance(value, int):
+            return value
+        return int(canonical_isbn(str(value)))
+
+    def pre_save(self, model_instance, add):
+        # Like auto_now fields, the instance gets the value that is actually stored
+        value = getattr(model_instance, self.attname)
+        if value is not None:
+            value = canonical_isbn(str(value))
+            setattr(model_instance, self.attname, value)
+        return value
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        # Skips the integer form fields of BigIntegerField, ISBN-10s may end with an X
+        return models.Field.formfield(self, **{"form_class": forms.CharField, **kwargs})
+
+
 class Book(models.Model):
 
 
@@ -26,17 +87,114 @@ class Book(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     description = models.TextField()
-    isbn = models.TextField(max_length=13, primary_key=True, validators=[somewhat_validate_isbn])
+    isbn = ISBNField(primary_key=True, validators=[somewhat_validate_isbn])
     publication_date = models.DateField()
     title = models.TextField()
 
     class Meta(TypedModelMeta):
         indexes: ClassVar[list[models.Index]] = [
             models.Index(fields=["created_at"]),
+            # The change feed reads books in this order, see books/changes.py
+            models.Index(fields=["updated_at", "isbn"]),
+            # Autocomplete, see books/autocomplete.py
+            models.Index(Collate(Lower("title"), "C"), name="books_book_title_prefix_idx"),
         ]
         verbose_name: ClassVar[str] = "Book"
         verbose_name_plural: ClassVar[str] = "Books"
         ordering: ClassVar[list[str]] = ["created_at"]
 
+    # (author, publication year) as loaded from the database, to know which statistics to move on update
+    loaded_stats_key: tuple[str, int] | None = None
+
     def __str__(self) -> str:
         return f"Book ISBN:{self.isbn} - {self.title}"
+
+    def save(self, *args, **kwargs) -> None:
+        # post_save is sent after the write's own transaction, so the statistics it updates (see books/signals.py)
+        # would drift if it failed. Deletes already send post_delete in their transaction
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "author" in field_names and "publication_date" in field_names:
+            instance.loaded_stats_key = (instance.author, instance.publication_date.year)
+        return instance
+
+
+class BookTombstone(models.Model):
+    """
+    Records that a book was deleted, so the change feed can tell consumers to delete it too.
+    Created by the trigger of the books table (migration 0012), so every delete is recorded, raw SQL included, with the
+    timestamp of its change stream event.
+    """
+
+    isbn = ISBNField(primary_key=True)
+    deleted_at = models.DateTimeField()
+
+    class Meta(TypedModelMeta):
+        indexes: ClassVar[list[models.Index]] = [
+            models.Index(fields=["deleted_at", "isbn"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"Book ISBN:{self.isbn} deleted at {self.deleted_at}"
+
+
+class BookCountByAuthor(models.Model):
+    """Number of books per author, kept up to date on writes (see books/stats.py)."""
+
+    author = models.TextField(primary_key=True)
+    books = models.BigIntegerField(default=0)
+
+    class Meta(TypedModelMeta):
+        indexes: ClassVar[list[models.Index]] = [
+            # Top authors
+            models.Index(fields=["-books", "author"]),
+            # Autocomplete, see books/autocomplete.py
+            models.Index(Collate(Lower("author"), "C"), name="books_author_prefix_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.author}: {self.books} books"
+
+
+class BookCountByYear(models.Model):
+    """Number of books per publication year, kept up to date on writes (see books/stats.py)."""
+
+    year = models.IntegerField(primary_key=True)
+    books = models.BigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.year}: {self.books} books"
+
+
+class ArchivedBook(models.Model):
+    """
+    A book that was not updated for a while, moved out of the books table by `python manage.py archive_books`
+    (see books/archive.py). It has the columns of Book, without auto_now, and only the index of the change feed.
+    """
+
+    author = models.TextField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    description = models.TextField()
+    isbn = ISBNField(primary_key=True)
+    publication_date = models.DateField()
+    title = models.TextField()
+    archived_at = models.DateTimeField()
+
+    class Meta(TypedModelMeta):
+        indexes: ClassVar[list[models.Index]] = [
+            # Archived books are still part of the change feed, see books/changes.py
+            models.Index(fields=["updated_at", "isbn"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"Book ISBN:{self.isbn} - {self.title} (archived)"
+
+    def as_book(self) -> Book:
+        """Returns the archived book as an unsaved Book."""
+        return Book(**{field.attname: getattr(self, field.attname) for field in Book._meta.concrete_fields})  # noqa: SLF001
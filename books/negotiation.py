@@ -0,0 +1,15 @@
+from django.conf import settings
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class APIModeContentNegotiation(DefaultContentNegotiation):
+    """
+    In API mode (settings.API_MODE), always responds with the first renderer instead of matching it against
+    the Accept header and the format parameter. The API only renders JSON, so the result is the same.
+    Request parsers are still selected from the Content-Type, as usual.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        if not settings.API_MODE:
+            return super().select_renderer(request, renderers, format_suffix)
+        return (renderers[0], renderers[0].media_type)
@@ -1,5 +1,13 @@
 from rest_framework.pagination import PageNumberPagination
 
+from books import metrics
+
 
 class BookPagination(PageNumberPagination):
     page_size = 10
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = super().paginate_queryset(queryset, request, view)
+        if page is not None:
+            metrics.PAGINATION_DEPTH.observe(self.page.number)
+        return page
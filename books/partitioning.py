@@ -0,0 +1,92 @@
+"""
+Hash partitioning of the books table on ISBN, for catalogs of tens or hundreds of millions of books (Postgres only).
+
+Each partition is a table with its own indexes, so they stay small enough to be cached, vacuums and index builds run
+per partition, and bulk loads don't rewrite one huge index. The ISBN is the primary key, and Postgres requires the
+partition key to be part of it, so partitioning on ISBN keeps the primary key as it is. Range partitioning on
+`created_at` would have needed `(created_at, isbn)` as primary key, which breaks the lookups by ISBN.
+
+How queries use the partitions:
+- detail lookups, updates and deletes filter on ISBN, so Postgres prunes all partitions but one;
+- list pages (ordered by `created_at`) and the change feed (ordered by `(updated_at, isbn)`) can't be pruned, but
+  each partition has its own index in that order and Postgres merges their sorted scans (Merge Append), reading
+  about `limit` rows per partition instead of sorting the table.
+
+The number of partitions is set with DJANGO_BOOKS_TABLE_PARTITIONS. Migration 0010 partitions the table when it is set,
+and `python manage.py partition_books_table` converts an existing database. The conversion copies every row while
+holding an exclusive lock on the table, so run it in a maintenance window. `python manage.py measure_books_table`
+reports the size of the table and its indexes, and lookup and list latencies, to compare both layouts.
+"""
+
+COPY_SUFFIX = "_partitioned"
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))",
+        [table],
+    )
+    return cursor.fetchone()[0]
+
+
+def partition_by_hash(cursor, table, column, partitions):
+    """
+    Replaces `table` with a table partitioned by hash of its primary key `column`, in `partitions` partitions named
+    `{table}_p{number}`. Rows, indexes and triggers are carried over. It must run in a transaction.
+    """
+    quote = '"{}"'.format
+    partitioned = f"{table}{COPY_SUFFIX}"
+    cursor.execute(f"LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE")
+    # The definitions of the indexes, other than the primary key, and of the triggers, to create them again
+    cursor.execute(
+        """
+        SELECT pg_get_indexdef(indexrelid) FROM pg_index
+        WHERE indrelid = to_regclass(%s) AND NOT indisprimary
+        """,
+        [table],
+    )
+    indexes = [definition for (definition,) in cursor.fetchall()]
+    cursor.execute(
+        "SELECT pg_get_triggerdef(oid) FROM pg_trigger WHERE tgrelid = to_regclass(%s) AND NOT tgisinternal",
+        [table],
+    )
+    triggers = [definition for (definition,) in cursor.fetchall()]
+
+    cursor.execute(
+        f"CREATE TABLE {quote(partitioned)} (LIKE {quote(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY HASH ({quote(column)})"
+    )
+    for remainder in range(partitions):
+        cursor.execute(
+            f"CREATE TABLE {quote(f'{table}_p{remainder}')} PARTITION OF {quote(partitioned)} "
+            f"FOR VALUES WITH (MODULUS {int(partitions)}, REMAINDER {remainder})"
+        )
+    # Loading before creating the indexes is much faster than maintaining them row by row
+    cursor.execute(f"INSERT INTO {quote(partitioned)} SELECT * FROM {quote(table)}")  # noqa: S608
+    cursor.execute(f"DROP TABLE {quote(table)}")
+    cursor.execute(f"ALTER TABLE {quote(partitioned)} RENAME TO {quote(table)}")
+    # Same name as the original primary key, which Postgres names after the table
+    cursor.execute(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(f'{table}_pkey')} PRIMARY KEY ({quote(column)})")
+    # The definitions name the table, which now is the partitioned one. Indexes on it are created on every partition
+    for definition in [*indexes, *triggers]:
+        cursor.execute(definition)
+    cursor.execute(f"ANALYZE {quote(table)}")
+
+
+def relation_sizes(cursor, table):
+    """Returns the number of partitions of `table`, the size of its rows and the size of its indexes, in bytes."""
+    cursor.execute(
+        """
+        WITH relations AS (
+            SELECT relid FROM pg_partition_tree(to_regclass(%(table)s)) WHERE isleaf
+            -- pg_partition_tree() returns nothing for tables that are not partitioned
+            UNION SELECT to_regclass(%(table)s) WHERE NOT EXISTS (
+                SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%(table)s)
+            )
+        )
+        SELECT count(*), coalesce(sum(pg_table_size(relid)), 0), coalesce(sum(pg_indexes_size(relid)), 0)
+        FROM relations
+        """,
+        {"table": table},
+    )
+    return cursor.fetchone()
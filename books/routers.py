@@ -0,0 +1,46 @@
+"""
+Database router that sends reads to the replicas in settings.DATABASE_REPLICAS and writes to the primary (default).
+
+Replicas lag behind the primary, so a client that has just written a book could read an older version of it.
+To avoid that, books.middleware.ReadYourWritesMiddleware pins the reads of a request to the primary when the
+client wrote something in the last settings.READ_YOUR_WRITES_SECONDS seconds. Requests that write are pinned too,
+so the reads done while validating and saving see the primary's data.
+"""
+
+import random
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_reads_pinned_to_primary: ContextVar[bool] = ContextVar("reads_pinned_to_primary", default=False)
+
+
+@contextmanager
+def pin_reads_to_primary(pinned: bool = True) -> Iterator[None]:  # noqa: FBT001, FBT002
+    token = _reads_pinned_to_primary.set(pinned)
+    try:
+        yield
+    finally:
+        _reads_pinned_to_primary.reset(token)
+
+
+def reads_pinned_to_primary() -> bool:
+    return _reads_pinned_to_primary.get()
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or _reads_pinned_to_primary.get():
+            return DEFAULT_DB_ALIAS
+        # Replicas are interchangeable, so there is no need for anything smarter than a random pick
+        return random.choice(settings.DATABASE_REPLICAS)  # noqa: S311
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primary and replicas hold the same data
+        return True
@@ -0,0 +1,83 @@
+import hashlib
+from dataclasses import dataclass
+from typing import ClassVar
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from django.utils.text import compress_string
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+from books.compression import accepts_gzip
+
+
+@dataclass(frozen=True)
+class RenderedSchema:
+    content: bytes
+    gzipped_content: bytes
+    etag: str
+    # Each representation has its own strong validator (RFC 9110), so caches can't serve one for the other
+    gzipped_etag: str
+    content_type: str
+    content_disposition: str
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """
+    Serves the OpenAPI schema from memory. drf-spectacular introspects every view and serializer to build the schema,
+    and the schema only changes when the code does, so it is generated once per process for each format, version and
+    language, on the first request.
+    Responses have an ETag, so clients that send If-None-Match get a 304, and a gzipped copy, with its own ETag, is
+    kept for clients that accept it. A 304 is only returned for the ETag of the copy the request would get.
+    """
+
+    _rendered_schemas: ClassVar[dict[tuple[str, str | None, str | None], RenderedSchema]] = {}
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        version = self.api_version or request.version or self._get_version_parameter(request)
+        key = (request.accepted_media_type, version, request.GET.get("lang"))
+        if (schema := self._rendered_schemas.get(key)) is None:
+            schema = self._rendered_schemas[key] = self._render_schema(request, *args, **kwargs)
+
+        gzipped = accepts_gzip(request)
+        etag = schema.gzipped_etag if gzipped else schema.etag
+        # Only the validator of the representation this request would get: a client that stopped accepting gzip must
+        # not be told that its gzipped copy is still fresh
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+        elif gzipped:
+            response = HttpResponse(schema.gzipped_content, content_type=schema.content_type)
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(schema.content, content_type=schema.content_type)
+        response["ETag"] = etag
+        response["Content-Disposition"] = schema.content_disposition
+        patch_vary_headers(response, ["Accept", "Accept-Encoding"])
+        return response
+
+    def _render_schema(self, request, *args, **kwargs):
+        response = super().get(request, *args, **kwargs)
+        renderer = request.accepted_renderer
+        content = renderer.render(
+            response.data,
+            request.accepted_media_type,
+            {"request": request, "response": response, "view": self},
+        )
+        content_type = request.accepted_media_type
+        if renderer.charset:
+            content_type = f"{content_type}; charset={renderer.charset}"
+        return RenderedSchema(
+            content=content,
+            # compress_string sets mtime=0, which keeps the gzipped bytes identical across processes
+            gzipped_content=compress_string(content),
+            etag=quote_etag(digest := hashlib.sha256(content).hexdigest()),
+            gzipped_etag=quote_etag(f"{digest}-gzip"),
+            content_type=content_type,
+            content_disposition=response["Content-Disposition"],
+        )
+
+    @classmethod
+    def clear_cache(cls):
+        cls._rendered_schemas.clear()
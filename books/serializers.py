@@ -1,18 +1,72 @@
 from rest_framework.exceptions import ValidationError
-from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import (
+    CharField,
+    DictField,
+    ListField,
+    ModelSerializer,
+    Serializer,
+)
 
-from books.models import Book
+from books.isbn import canonical_isbn
+from books.models import ArchivedBook, Book, ISBNField
+
+ISBN_IMMUTABLE_MESSAGE = "This field cannot be updated. If you need to update it, delete the book and create a new one."
+MAX_BULK_SIZE = 1000
 
 
 class BookSerializer(ModelSerializer[Book]):
+    """
+    Accepts an optional `fields` argument with the names of the fields to serialize, so clients can ask only for
+    what they need (see `?fields=` in BookViewSet). By default, all fields are serialized.
+    """
+
+    # ISBNs are stored as integers, but they are strings for clients
+    serializer_field_mapping = {**ModelSerializer.serializer_field_mapping, ISBNField: CharField}
 
     class Meta:
         model = Book
         fields = "__all__"
 
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+    def validate_isbn(self, value):
+        # The unique validator only looks at the books table, see books/archive.py
+        if self.instance is None and ArchivedBook.objects.filter(isbn=value).exists():
+            raise ValidationError("Book with this isbn already exists.")
+        return value
+
     def update(self, instance, validated_data):
-        if "isbn" in validated_data and instance.isbn != validated_data["isbn"]:
-            raise ValidationError(
-                {"isbn": "This field cannot be updated. If you need to update it, delete the book and create a new one."}
-            )
+        # Any form of the book's ISBN is the same ISBN
+        if "isbn" in validated_data and canonical_isbn(validated_data.pop("isbn")) != instance.isbn:
+            raise ValidationError({"isbn": ISBN_IMMUTABLE_MESSAGE})
         return super().update(instance, validated_data)
+
+
+class BulkDeleteSerializer(Serializer):
+    isbns = ListField(child=CharField(), min_length=1, max_length=MAX_BULK_SIZE)
+
+
+class BulkPartialUpdateSerializer(BulkDeleteSerializer):
+    """
+    The same `changes` are applied to every book in `isbns`. They are validated like a PATCH of a single book,
+    and ISBNs can't be changed.
+    """
+
+    changes = DictField()
+
+    def validate_changes(self, changes):
+        if "isbn" in changes:
+            raise ValidationError({"isbn": ISBN_IMMUTABLE_MESSAGE})
+        serializer = BookSerializer(data=changes, partial=True)
+        # Unknown and read-only fields would be dropped silently, and the books updated with no change
+        writable = {name for name, field in serializer.fields.items() if not field.read_only}
+        if unknown := sorted(set(changes) - writable):
+            raise ValidationError({name: "This field cannot be changed." for name in unknown})
+        serializer.is_valid(raise_exception=True)
+        if not serializer.validated_data:
+            raise ValidationError("At least one field must be changed.")
+        return serializer.validated_data
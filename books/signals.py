@@ -0,0 +1,54 @@
+from collections import Counter
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from books import autocomplete, bloom, stats
+from books.models import Book
+
+
+@receiver(pre_save, sender=Book)
+def load_stats_key(sender, instance, raw, **kwargs):
+    # Books that were not loaded with their author and publication date, e.g. with .only(), get them before the
+    # update overwrites them
+    if raw or instance.loaded_stats_key is not None or instance._state.adding:  # noqa: SLF001
+        return
+    if row := Book.objects.filter(pk=instance.pk).values_list("author", "publication_date").first():
+        instance.loaded_stats_key = stats.stats_key(*row)
+
+
+@receiver(post_save, sender=Book)
+def update_stats_on_save(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    key = stats.stats_key(instance.author, instance.publication_date)
+    previous_key = None if created else instance.loaded_stats_key
+    if key != previous_key:
+        deltas = Counter({key: 1})
+        if previous_key is not None:
+            deltas[previous_key] -= 1
+        stats.apply_deltas(deltas)
+    instance.loaded_stats_key = key
+
+
+@receiver(post_delete, sender=Book)
+def update_stats_on_delete(sender, instance, **kwargs):
+    key = instance.loaded_stats_key or stats.stats_key(instance.author, instance.publication_date)
+    stats.apply_deltas(Counter({key: -1}))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_autocomplete(sender, **kwargs):
+    autocomplete.invalidate()
+
+
+@receiver(post_save, sender=Book)
+def add_to_bloom_filter(sender, instance, created, **kwargs):
+    if created:
+        bloom.add(instance.isbn)
+
+
+@receiver(post_delete, sender=Book)
+def count_bloom_filter_delete(sender, **kwargs):
+    bloom.record_delete()
@@ -0,0 +1,90 @@
+"""
+Worker startup: what is imported and built before a gunicorn worker serves its first request.
+
+With GUNICORN_PRELOAD=True, gunicorn.conf.py loads the application in the master process and calls warm_up() before
+forking, so the workers start with the URL resolvers compiled, the model and serializer metadata built and the
+OpenAPI schema rendered, instead of each worker doing it on its first requests. Memory written before the fork is
+shared by all the workers until they write to it, so it is counted once.
+
+Development-only packages are not imported by the application, e.g. django-stubs-ext is only imported for type
+checking (see books/models.py). `python manage.py profile_startup` reports the import time per package and the memory
+of a process, or of the workers of a running gunicorn.
+"""
+
+import re
+from collections import Counter
+from pathlib import Path
+
+from django.apps import apps
+from django.db import connections
+from django.urls import URLResolver, get_resolver, reverse
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+\d+ \| *(\S+)$")
+
+
+def _compile_patterns(resolver):
+    for pattern in resolver.url_patterns:
+        # Compiled on first access, then kept on the pattern
+        pattern.pattern.regex  # noqa: B018
+        if isinstance(pattern, URLResolver):
+            _compile_patterns(pattern)
+
+
+def warm_up():
+    """Builds what requests would otherwise build on first use. It doesn't open database or Redis connections."""
+    # Imported here, the workers that don't preload never need them
+    from django.test import RequestFactory
+
+    from books.schema import CachedSpectacularAPIView
+    from books.serializers import (
+        BookSerializer,
+        BulkDeleteSerializer,
+        BulkPartialUpdateSerializer,
+    )
+
+    _compile_patterns(get_resolver())
+    # Fills the reverse lookup tables
+    reverse("book-list")
+    for model in apps.get_models():
+        model._meta.get_fields()  # noqa: SLF001
+    for serializer_class in (BookSerializer, BulkDeleteSerializer, BulkPartialUpdateSerializer):
+        serializer_class().fields  # noqa: B018
+    schema_view = CachedSpectacularAPIView.as_view()
+    factory = RequestFactory()
+    for accept in ("application/vnd.oai.openapi", "application/vnd.oai.openapi+json"):
+        schema_view(factory.get(reverse("schema"), headers={"accept": accept}))
+    # Connections must not be shared with the forked workers
+    connections.close_all()
+
+
+def import_times(lines):
+    """
+    Parses the output of `python -X importtime` and returns the time spent importing the modules of each top-level
+    package, in microseconds, as a Counter. Modules imported by a package count for their own package.
+    """
+    times = Counter()
+    for line in lines:
+        if match := IMPORTTIME_LINE.match(line):
+            times[match[2].split(".")[0]] += int(match[1])
+    return times
+
+
+def process_memory(pid="self"):
+    """
+    Returns the resident memory of a process, its proportional share (PSS, shared pages divided between the processes
+    sharing them) and its private memory, in bytes. Linux only.
+    """
+    memory = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+        name, _, value = line.partition(":")
+        if name in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+            memory[name] = int(value.split()[0]) * 1024
+    return {
+        "rss": memory["Rss"],
+        "pss": memory["Pss"],
+        "private": memory["Private_Clean"] + memory["Private_Dirty"],
+    }
+
+
+def child_pids(pid):
+    return [int(child) for child in Path(f"/proc/{pid}/task/{pid}/children").read_text().split()]
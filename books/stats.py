@@ -0,0 +1,105 @@
+"""
+Catalog statistics: number of books in total, per author, per publication year and per decade.
+
+Counting them with GROUP BY on every request would scan the whole books table, so the counts per author and per year
+are kept in their own tables (BookCountByAuthor and BookCountByYear) and moved by the Book signals in
+books/signals.py whenever a book is created, deleted, or changes author or publication year. The signals run in the
+transaction of the write, so a write and its counts are committed together. The total and the
+decades are summed from the years, which are a few hundred rows at most.
+
+Writes that skip the signals, like bulk_create, QuerySet.update or raw SQL, are not counted.
+`python manage.py rebuild_catalog_stats` recounts everything from the books table and the archive (see books/archive.py).
+"""
+
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import ExtractYear
+
+from books.models import ArchivedBook, Book, BookCountByAuthor, BookCountByYear
+
+REBUILD_BATCH_SIZE = 10_000
+
+
+def stats_key(author, publication_date):
+    # Until a book is loaded back from the database, publication_date can still be the string it was created with
+    publication_date = Book._meta.get_field("publication_date").to_python(publication_date)  # noqa: SLF001
+    return author, publication_date.year
+
+
+def apply_deltas(deltas):
+    """
+    Adds to the counts the number of books in `deltas`, a Counter of (author, year) keys,
+    which is negative for books that are gone.
+    """
+    authors = Counter()
+    years = Counter()
+    for (author, year), delta in deltas.items():
+        authors[author] += delta
+        years[year] += delta
+    # Rows are locked in the same order by every writer, so two writes moving the same counts can't deadlock
+    with transaction.atomic():
+        for author, delta in sorted(authors.items()):
+            _increment(BookCountByAuthor, {"author": author}, delta)
+        for year, delta in sorted(years.items()):
+            _increment(BookCountByYear, {"year": year}, delta)
+
+
+def _increment(model, lookup, delta):
+    if delta == 0 or model.objects.filter(**lookup).update(books=F("books") + delta):
+        return
+    # First book for this key. get_or_create handles another process creating the row at the same time
+    _, created = model.objects.get_or_create(**lookup, defaults={"books": delta})
+    if not created:
+        model.objects.filter(**lookup).update(books=F("books") + delta)
+
+
+def _add_counts(model, key_field, rows):
+    """Adds the (key, count) `rows` to the counts of `model`. There can be millions of authors, so it goes by batches."""
+    while batch := dict(islice(rows, REBUILD_BATCH_SIZE)):
+        existing = model.objects.in_bulk(list(batch))
+        for key, row in existing.items():
+            row.books += batch.pop(key)
+        model.objects.bulk_update(existing.values(), ["books"])
+        model.objects.bulk_create(model(**{key_field: key}, books=count) for key, count in batch.items())
+
+
+def rebuild():
+    """
+    Recounts the statistics from the books table and the archive. It scans both tables, so it is meant for
+    maintenance.
+    """
+    with transaction.atomic():
+        BookCountByAuthor.objects.all().delete()
+        BookCountByYear.objects.all().delete()
+        for model in (Book, ArchivedBook):
+            authors = model.objects.values("author").annotate(count=Count("*")).order_by().values_list("author", "count")
+            _add_counts(BookCountByAuthor, "author", authors.iterator(chunk_size=REBUILD_BATCH_SIZE))
+            years = (
+                model.objects.annotate(year=ExtractYear("publication_date"))
+                .values("year")
+                .annotate(count=Count("*"))
+                .order_by()
+                .values_list("year", "count")
+            )
+            _add_counts(BookCountByYear, "year", iter(years))
+
+
+def catalog_stats(top_authors):
+    """Returns the total number of books, the counts per decade and per year, and the `top_authors` biggest authors."""
+    by_year = list(BookCountByYear.objects.filter(books__gt=0).order_by("year").values("year", "books"))
+    by_decade = Counter()
+    for row in by_year:
+        by_decade[row["year"] // 10 * 10] += row["books"]
+    return {
+        "total": sum(row["books"] for row in by_year),
+        "by_decade": [{"decade": decade, "books": books} for decade, books in sorted(by_decade.items())],
+        "by_year": by_year,
+        "top_authors": list(
+            BookCountByAuthor.objects.filter(books__gt=0).order_by("-books", "author").values("author", "books")[
+                :top_authors
+            ]
+        ),
+    }
@@ -0,0 +1,226 @@
+"""
+Real time stream of book changes, as Server-Sent Events.
+
+A trigger on the books table (migration 0006) publishes every insert, update and delete with Postgres NOTIFY,
+including the ones done by bulk SQL. Each process keeps a single connection LISTENing to them, and ChangeBroadcaster
+fans the events out to the subscribers of that process, so the number of clients doesn't change the load on Postgres.
+
+Each event has the change feed cursor of the change as its id (see books/changes.py). A client that reconnects with
+Last-Event-ID, as browsers' EventSource do, or that connects with `?cursor=`, first gets the changes it missed from
+the change feed, then the live events. Delivery is at least once: a change can be sent twice around a reconnection.
+
+Live events are sent in commit order, while their ids are in (updated_at, isbn) order, and a slow transaction commits
+a change older than the ones committed meanwhile (see books/changes.py). So the replay starts
+settings.CHANGE_FEED_DELAY_SECONDS before the position of the client, and the changes of the last seconds before it
+disconnected are sent again.
+
+Each subscriber has a bounded queue. A subscriber that falls behind doesn't slow down the others: when its queue is
+full, its stream is closed and it resumes from its last event once it reconnects. The same happens to every subscriber
+if the listening connection is lost, since events may have been missed in the meantime.
+
+The stream needs an async server: it is served under ASGI (uvicorn) and refused under WSGI, see the README.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+
+import psycopg
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import DEFAULT_DB_ALIAS
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from psycopg.conninfo import make_conninfo
+
+from books.changes import changes_after, decode_cursor, encode_cursor
+from books.isbn import ISBN13_LENGTH
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "book_changes"
+REPLAY_PAGE_SIZE = 1000
+RECONNECT_DELAY_SECONDS = 1
+LISTEN_TIMEOUT_SECONDS = 5
+
+
+def change_event(changed_at, isbn, deleted):
+    """Formats a change as a Server-Sent Event."""
+    data = json.dumps({"isbn": isbn, "deleted": deleted, "changed_at": changed_at.isoformat()})
+    return f"id: {encode_cursor((changed_at, isbn))}\nevent: change\ndata: {data}\n\n"
+
+
+def notification_event(payload):
+    """Formats the payload sent by the books_book_notify_change trigger as a Server-Sent Event."""
+    change = json.loads(payload)
+    return change_event(
+        datetime.fromisoformat(change["at"]),
+        f"{change['isbn']:0{ISBN13_LENGTH}d}",
+        deleted=change["op"] == "d",
+    )
+
+
+class Subscription:
+    def __init__(self, max_queue_size):
+        # None in the queue means the stream must be closed
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue(max_queue_size)
+
+    def put(self, event):
+        """Returns False if the subscriber is too far behind to take the event."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def close(self):
+        # Anything still queued would be sent before the close, so it is dropped
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class ChangeBroadcaster:
+    """Fans the notifications of a single LISTEN connection out to the subscribers of the process."""
+
+    def __init__(self, max_queue_size=None):
+        self.max_queue_size = max_queue_size or settings.CHANGE_STREAM_QUEUE_SIZE
+        self.subscriptions: set[Subscription] = set()
+        self.listening = asyncio.Event()
+        self._listener = None
+
+    def subscribe(self):
+        subscription = Subscription(self.max_queue_size)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+
+    def publish(self, event):
+        for subscription in list(self.subscriptions):
+            if not subscription.put(event):
+                self.drop(subscription)
+
+    def drop(self, subscription):
+        self.unsubscribe(subscription)
+        subscription.close()
+
+    def drop_all(self):
+        for subscription in list(self.subscriptions):
+            self.drop(subscription)
+
+    async def start(self):
+        """
+        Starts listening, if not started yet, and waits until notifications are being received.
+        Raises TimeoutError if that takes more than LISTEN_TIMEOUT_SECONDS.
+        """
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self.listen())
+        await asyncio.wait_for(self.listening.wait(), LISTEN_TIMEOUT_SECONDS)
+
+    async def listen(self):
+        # Notifications are only sent on the primary
+        database = settings.DATABASES[DEFAULT_DB_ALIAS]
+        conninfo = make_conninfo(
+            dbname=database["NAME"],
+            user=database["USER"],
+            password=database["PASSWORD"],
+            host=database["HOST"],
+            port=database["PORT"],
+        )
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as connection:
+                    await connection.execute(f"LISTEN {CHANNEL}")
+                    self.listening.set()
+                    async for notification in connection.notifies():
+                        self.publish(notification_event(notification.payload))
+            except psycopg.Error:
+                logger.exception("Lost the connection listening to book changes, reconnecting")
+            self.listening.clear()
+            # Subscribers may have missed events while there was no connection, they resume from their last event
+            self.drop_all()
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+
+_broadcaster = None
+
+
+def get_broadcaster():
+    # Created on first use, in the event loop of the server
+    global _broadcaster  # noqa: PLW0603
+    if _broadcaster is None:
+        _broadcaster = ChangeBroadcaster()
+    return _broadcaster
+
+
+async def replay_changes(position, until):
+    """Yields the changes after `position` up to `until` from the change feed, as Server-Sent Events."""
+    has_more = True
+    while has_more:
+        changes, has_more = await sync_to_async(changes_after)(position, REPLAY_PAGE_SIZE, until=until)
+        for change in changes:
+            yield change_event(change.changed_at, change.isbn, deleted=change.book is None)
+        if changes:
+            position = changes[-1].position
+
+
+def replay_position(position):
+    """Returns the position the replay of a client resuming after `position` starts from."""
+    if not settings.CHANGE_FEED_DELAY_SECONDS:
+        return position
+    changed_at, isbn = position
+    # A microsecond earlier, so every change at the start of the delay is replayed, whatever its ISBN
+    return changed_at - timedelta(seconds=settings.CHANGE_FEED_DELAY_SECONDS, microseconds=1), isbn
+
+
+async def change_events(broadcaster, position):
+    """
+    Yields the Server-Sent Events of a subscriber, starting after `position` if it is not None.
+    Ends when the broadcaster drops the subscriber.
+    """
+    # Subscribing before replaying ensures nothing happening during the replay is missed
+    subscription = broadcaster.subscribe()
+    try:
+        yield f"retry: {RECONNECT_DELAY_SECONDS * 1000}\n\n"
+        if position is not None:
+            async for event in replay_changes(replay_position(position), until=timezone.now()):
+                yield event
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), settings.CHANGE_STREAM_HEARTBEAT_SECONDS)
+            except TimeoutError:
+                # Keeps proxies and load balancers from closing an idle connection
+                yield ": heartbeat\n\n"
+                continue
+            if event is None:
+                return
+            yield event
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+async def stream_changes(request):
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"detail": "The change stream is only served under ASGI."}, status=501)
+
+    position = None
+    if cursor := request.headers.get("Last-Event-ID") or request.GET.get("cursor"):
+        try:
+            position = decode_cursor(cursor)
+        except ValueError:
+            return JsonResponse({"cursor": ["This is not a cursor returned by the change feed."]}, status=400)
+
+    broadcaster = get_broadcaster()
+    try:
+        await broadcaster.start()
+    except TimeoutError:
+        return JsonResponse({"detail": "The change stream is unavailable, please retry later."}, status=503)
+    response = StreamingHttpResponse(change_events(broadcaster, position), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Tells nginx not to buffer the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,158 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from books import archive, bloom, stats
+from books.changes import changes_after
+from books.models import ArchivedBook, Book, BookCountByAuthor, BookTombstone
+
+
+def create_book(isbn, title="Title", updated_days_ago=0):
+    Book.objects.create(
+        isbn=isbn,
+        title=title,
+        author="J.R.R. Tolkien",
+        description="Description",
+        publication_date="1954-07-29",
+    )
+    # updated_at is set on every save, so old books are made with an update
+    Book.objects.filter(isbn=isbn).update(updated_at=timezone.now() - timedelta(days=updated_days_ago))
+    return Book.objects.get(isbn=isbn)
+
+
+class ArchiveTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.old = create_book("9780544003415", "The Lord of the Rings", updated_days_ago=400)
+        self.recent = create_book("9780547928227", "The Hobbit", updated_days_ago=10)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_archive_moves_old_books(self):
+        self.assertEqual(archive.archive(days=365, pause=0), 1)
+
+        self.assertEqual(list(Book.objects.values_list("isbn", flat=True)), [self.recent.isbn])
+        archived = ArchivedBook.objects.get()
+        self.assertEqual(
+            (archived.isbn, archived.title, archived.created_at, archived.updated_at),
+            (self.old.isbn, self.old.title, self.old.created_at, self.old.updated_at),
+        )
+
+    def test_archive_goes_by_batches(self):
+        create_book("9780747532699", updated_days_ago=500)
+        progress = []
+
+        archive.archive(days=365, batch_size=1, pause=0, progress=progress.append)
+
+        self.assertEqual(progress, [1, 2])
+        self.assertEqual(ArchivedBook.objects.count(), 2)
+
+    def test_moves_do_not_change_the_catalog(self):
+        archive.archive(days=365, pause=0)
+
+        self.assertFalse(BookTombstone.objects.exists())
+        self.assertEqual(BookCountByAuthor.objects.get(author="J.R.R. Tolkien").books, 2)
+        stats.rebuild()
+        self.assertEqual(BookCountByAuthor.objects.get(author="J.R.R. Tolkien").books, 2)
+
+    @override_settings(CHANGE_FEED_DELAY_SECONDS=0)
+    def test_change_feed_includes_archived_books(self):
+        archive.archive(days=365, pause=0)
+
+        changes, has_more = changes_after(None, 10)
+
+        self.assertEqual([change.isbn for change in changes], [self.old.isbn, self.recent.isbn])
+        self.assertEqual(changes[0].book.title, "The Lord of the Rings")
+        self.assertFalse(has_more)
+        # Moves don't change the position of the book in the feed
+        self.assertEqual(changes_after(changes[0].position, 10)[0], changes[1:])
+
+    @patch("httpx.get")
+    def test_detail_falls_through_to_the_archive(self, mock_get):
+        mock_get.return_value.json.return_value = {}
+        archive.archive(days=365, pause=0)
+
+        response = self.client.get(reverse("book-detail", args=["0-544-00341-1"]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["title"], "The Lord of the Rings")
+        self.assertFalse(Book.objects.filter(isbn=self.old.isbn).exists())
+
+    def test_updates_restore_the_book(self):
+        archive.archive(days=365, pause=0)
+
+        response = self.client.patch(reverse("book-detail", args=[self.old.isbn]), {"title": "The Return of the King"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(ArchivedBook.objects.exists())
+        book = Book.objects.get(isbn=self.old.isbn)
+        self.assertEqual((book.title, book.created_at), ("The Return of the King", self.old.created_at))
+        self.assertGreater(book.updated_at, self.old.updated_at)
+
+    def test_deletes_restore_the_book_first(self):
+        archive.archive(days=365, pause=0)
+
+        response = self.client.delete(reverse("book-detail", args=[self.old.isbn]))
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(ArchivedBook.objects.exists())
+        self.assertTrue(BookTombstone.objects.filter(isbn=self.old.isbn).exists())
+        self.assertEqual(BookCountByAuthor.objects.get(author="J.R.R. Tolkien").books, 1)
+
+    def test_bulk_updates_restore_the_books(self):
+        archive.archive(days=365, pause=0)
+
+        response = self.client.patch(
+            reverse("book-bulk-partial-update"),
+            {"isbns": [self.old.isbn, self.recent.isbn], "changes": {"author": "Tolkien"}},
+            format="json",
+        )
+
+        self.assertEqual([result["result"] for result in response.data["results"]], ["updated", "updated"])
+        self.assertFalse(ArchivedBook.objects.exists())
+        self.assertEqual(Book.objects.filter(author="Tolkien").count(), 2)
+        self.assertEqual(BookCountByAuthor.objects.get(author="Tolkien").books, 2)
+
+    def test_bulk_deletes_restore_the_books_first(self):
+        archive.archive(days=365, pause=0)
+
+        response = self.client.post(reverse("book-bulk-destroy"), {"isbns": [self.old.isbn]}, format="json")
+
+        self.assertEqual(response.data["results"], [{"isbn": self.old.isbn, "result": "deleted"}])
+        self.assertFalse(ArchivedBook.objects.exists())
+        self.assertFalse(Book.objects.filter(isbn=self.old.isbn).exists())
+        self.assertTrue(BookTombstone.objects.filter(isbn=self.old.isbn).exists())
+        self.assertEqual(BookCountByAuthor.objects.get(author="J.R.R. Tolkien").books, 1)
+
+    def test_archived_isbns_cannot_be_created_again(self):
+        archive.archive(days=365, pause=0)
+
+        response = self.client.post(
+            reverse("book-list"),
+            {
+                "isbn": self.old.isbn,
+                "title": "Title",
+                "author": "Author",
+                "description": "Description",
+                "publication_date": "2000-01-01",
+            },
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("isbn", response.data)
+
+    def test_bloom_filter_rebuild_includes_archived_books(self):
+        archive.archive(days=365, pause=0)
+        try:
+            bloom.rebuild()
+            self.assertTrue(bloom.might_contain(self.old.isbn))
+        finally:
+            key, _, _ = bloom.filter_key()
+            bloom.get_client().delete(key, f"{key}:deletes")
@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from books.models import Book
+
+
+class AutocompleteTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.autocomplete_url = reverse("book-autocomplete")
+        for isbn, title, author in (
+            ("9780544003415", "The Lord of the Rings", "J.R.R. Tolkien"),
+            ("9780547928227", "The Hobbit", "J.R.R. Tolkien"),
+            ("9780747532699", "Harry Potter and the Philosopher's Stone", "J.K. Rowling"),
+            ("9780261102361", "the lord of the rings: the fellowship of the ring", "J.R.R. Tolkien"),
+        ):
+            Book.objects.create(
+                isbn=isbn,
+                title=title,
+                author=author,
+                description="Description",
+                publication_date="1954-07-29",
+            )
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_titles_match_prefix_ignoring_case(self):
+        response = self.client.get(self.autocomplete_url, {"q": "THE LORD"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["results"],
+            (
+                {"isbn": "9780544003415", "title": "The Lord of the Rings"},
+                {"isbn": "9780261102361", "title": "the lord of the rings: the fellowship of the ring"},
+            ),
+        )
+
+    def test_limit(self):
+        response = self.client.get(self.autocomplete_url, {"q": "the ", "limit": 1})
+        self.assertEqual([match["title"] for match in response.data["results"]], ["The Hobbit"])
+
+    def test_authors(self):
+        response = self.client.get(self.autocomplete_url, {"q": "j.", "field": "author"})
+        self.assertEqual(
+            response.data["results"],
+            ({"author": "J.K. Rowling", "books": 1}, {"author": "J.R.R. Tolkien", "books": 3}),
+        )
+
+    def test_prefix_wildcards_are_literal(self):
+        response = self.client.get(self.autocomplete_url, {"q": "%"})
+        self.assertEqual(response.data["results"], ())
+
+    def test_cached_until_a_book_is_written(self):
+        self.client.get(self.autocomplete_url, {"q": "harry"})
+        with self.assertNumQueries(0):
+            self.client.get(self.autocomplete_url, {"q": "Harry"})
+
+        self.client.patch(reverse("book-detail", args=["9780747532699"]), {"title": "Harry Potter"})
+
+        response = self.client.get(self.autocomplete_url, {"q": "harry"})
+        self.assertEqual(response.data["results"], ({"isbn": "9780747532699", "title": "Harry Potter"},))
+
+    def test_invalid_parameters(self):
+        for params in ({}, {"q": " "}, {"q": "a" * 101}, {"q": "a", "field": "isbn"}, {"q": "a", "limit": "51"}):
+            response = self.client.get(self.autocomplete_url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,105 @@
+import logging
+from unittest.mock import patch
+
+import redis
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from books import bloom
+from books.models import Book
+
+
+def create_book(isbn):
+    return Book.objects.create(
+        isbn=isbn,
+        title="Title",
+        author="Author",
+        description="Description",
+        publication_date="2000-01-01",
+    )
+
+
+class BloomFilterTests(TestCase):
+    def tearDown(self):
+        key, _, _ = bloom.filter_key()
+        bloom.get_client().delete(key, f"{key}:deletes")
+
+    def test_filter_size(self):
+        self.assertEqual(bloom.filter_size(1_000_000, 0.01), (9_585_059, 7))
+
+    def test_everything_might_be_there_until_the_filter_is_built(self):
+        self.assertTrue(bloom.might_contain("9780544003415"))
+
+    def test_rebuild_and_create(self):
+        create_book("9780544003415")
+        bloom.rebuild()
+        create_book("9780547928227")
+
+        self.assertTrue(bloom.might_contain("9780544003415"))
+        self.assertTrue(bloom.might_contain("9780547928227"))
+        self.assertFalse(bloom.might_contain("9780747532699"))
+
+    def test_deletes_are_counted(self):
+        book = create_book("9780544003415")
+        bloom.rebuild()
+        book.delete()
+
+        self.assertEqual(bloom.deletes_since_rebuild(), 1)
+        # Bloom filters can't remove items
+        self.assertTrue(bloom.might_contain("9780544003415"))
+
+        bloom.rebuild()
+        self.assertEqual(bloom.deletes_since_rebuild(), 0)
+        self.assertFalse(bloom.might_contain("9780544003415"))
+
+    def test_redis_down_means_maybe(self):
+        bloom.rebuild()
+        logging.disable(logging.CRITICAL)
+        try:
+            with patch.object(bloom.get_client(), "pipeline", side_effect=redis.ConnectionError("Redis is down")):
+                self.assertTrue(bloom.might_contain("9780544003415"))
+        finally:
+            logging.disable(logging.NOTSET)
+
+
+class BloomFilterDetailTests(APITestCase):
+    def setUp(self):
+        create_book("9780544003415")
+        bloom.rebuild()
+
+    def tearDown(self):
+        cache.clear()
+        key, _, _ = bloom.filter_key()
+        bloom.get_client().delete(key, f"{key}:deletes")
+
+    def test_unknown_isbn_is_not_found_without_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("book-detail", args=["9780747532699"]))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(len(queries), 0)
+
+    def test_known_isbn_is_found(self):
+        response = self.client.get(reverse("book-detail", args=["0-544-00341-1"]), {"fields": "isbn"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_books_that_could_not_be_added_are_found(self):
+        self.addCleanup(bloom._unadded.clear)  # noqa: SLF001
+        logging.disable(logging.CRITICAL)
+        try:
+            with patch("books.bloom._set_bits", side_effect=redis.ConnectionError("Redis is down")):
+                create_book("9780747532699")
+                self.assertTrue(bloom.might_contain("9780747532699"))
+        finally:
+            logging.disable(logging.NOTSET)
+
+        response = self.client.get(reverse("book-detail", args=["9780747532699"]), {"fields": "isbn"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Added by that check, since Redis is back
+        self.assertEqual(bloom._unadded, set())  # noqa: SLF001
+        self.assertTrue(bloom.might_contain("9780747532699"))
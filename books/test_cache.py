@@ -0,0 +1,111 @@
+import os
+from collections import Counter
+from unittest.mock import patch
+
+import redis
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from books.cache import HashRing, ShardedRedisCache
+from books.models import Book
+
+
+def node_urls(count):
+    # Databases of the same Redis server stand in for separate nodes
+    base_url = os.environ["REDIS_URL"].rsplit("/", 1)[0]
+    return [f"{base_url}/{database}" for database in range(15, 15 - count, -1)]
+
+
+def sharded_caches(count):
+    return {
+        "default": {
+            "BACKEND": "books.cache.InstrumentedShardedRedisCache",
+            "LOCATION": ",".join(node_urls(count)),
+        }
+    }
+
+
+class HashRingTests(SimpleTestCase):
+    keys = [f"key-{index}" for index in range(10_000)]
+
+    def test_keys_are_spread_over_nodes(self):
+        ring = HashRing(["a", "b", "c"])
+        counts = Counter(ring.node_index(key) for key in self.keys)
+        for node in range(3):
+            self.assertGreater(counts[node], len(self.keys) * 0.25)
+
+    def test_adding_a_node_only_moves_keys_to_it(self):
+        ring = HashRing(["a", "b", "c"])
+        bigger_ring = HashRing(["a", "b", "c", "d"])
+
+        moved = [key for key in self.keys if ring.node_index(key) != bigger_ring.node_index(key)]
+
+        self.assertTrue(all(bigger_ring.node_index(key) == 3 for key in moved))  # noqa: PLR2004
+        self.assertLess(len(moved), len(self.keys) * 0.35)
+
+
+class ShardedRedisCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = ShardedRedisCache(",".join(node_urls(3)), {})
+        self.nodes = [redis.Redis(connection_pool=redis.ConnectionPool.from_url(url)) for url in node_urls(3)]
+
+    def tearDown(self):
+        self.cache.clear()
+
+    def test_keys_are_stored_on_their_node(self):
+        keys = [f"key-{index}" for index in range(30)]
+        self.cache.set_many(dict.fromkeys(keys, "value"))
+
+        ring = HashRing(node_urls(3))
+        for key in keys:
+            stored_key = self.cache.make_key(key)
+            self.assertTrue(self.nodes[ring.node_index(stored_key)].exists(stored_key))
+        self.assertTrue(all(node.dbsize() > 0 for node in self.nodes))
+
+    def test_get_many_and_delete_many_across_nodes(self):
+        data = {f"key-{index}": index for index in range(30)}
+        self.cache.set_many(data, timeout=60)
+
+        self.assertEqual(self.cache.get_many([*data, "missing"]), data)
+
+        self.cache.delete_many(list(data)[:20])
+        self.assertEqual(self.cache.get_many(data), dict(list(data.items())[20:]))
+
+    def test_single_key_commands(self):
+        self.assertTrue(self.cache.add("counter", 1))
+        self.assertEqual(self.cache.incr("counter"), 2)
+        self.assertTrue(self.cache.delete("counter"))
+        self.assertIsNone(self.cache.get("counter"))
+
+    def test_clear_flushes_every_node(self):
+        self.cache.set_many({f"key-{index}": index for index in range(30)})
+        self.cache.clear()
+        self.assertTrue(all(node.dbsize() == 0 for node in self.nodes))
+
+
+@override_settings(CACHES=sharded_caches(3))
+class ShardedDetailCacheTests(APITestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            isbn="9780544003415",
+            title="The Lord of the Rings",
+            author="J.R.R. Tolkien",
+            description="Description",
+            publication_date="1954-07-29",
+        )
+        self.detail_url = reverse("book-detail", args=[self.book.isbn])
+
+    def tearDown(self):
+        ShardedRedisCache(",".join(node_urls(3)), {}).clear()
+
+    @patch("httpx.get")
+    def test_detail_cache_is_invalidated_on_update(self, mock_get):
+        mock_get.return_value.json.return_value = {}
+        self.client.get(self.detail_url)
+        self.client.get(self.detail_url)
+        mock_get.assert_called_once()
+
+        self.client.patch(self.detail_url, {"title": "The Hobbit"})
+
+        self.assertEqual(self.client.get(self.detail_url).data["title"], "The Hobbit")
@@ -1,10 +1,16 @@
+import gzip
+import json
+from unittest.mock import patch
+
 from django.core.cache import cache
-from django.test import TestCase
+from django.test import RequestFactory, TestCase
 from django.urls import reverse
+from django.utils.cache import get_cache_key
 from rest_framework import viewsets
 from rest_framework.response import Response
 from rest_framework.test import APIClient
 
+from books.compression import accepts_gzip
 from books.decorators import (
     _attach_decorator_to_methods,
     viewset_cache_detail_with_reset_on_update,
@@ -75,6 +81,62 @@ class CacheDecoratorTests(TestCase):
         cache.clear()
 
 
+@patch("httpx.get")
+class CompressedCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Book.objects.create(
+            isbn="9780544003415",
+            title="The Lord of the Rings",
+            author="J.R.R. Tolkien",
+            description="An epic fantasy novel",
+            publication_date="1954-07-29",
+        )
+        self.url = reverse("book-detail", args=["9780544003415"])
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_cached_response_is_stored_gzipped(self, mock_get):
+        mock_get.return_value.json.return_value = {"description": "OpenLibrary data " * 100}
+        plain = self.client.get(self.url)
+
+        cache_key = get_cache_key(RequestFactory().get(self.url), method="GET")
+        stored = cache.get(cache_key)
+        self.assertEqual(stored["Content-Encoding"], "gzip")
+        self.assertLess(len(stored.content), len(plain.content))
+        self.assertEqual(gzip.decompress(stored.content), plain.content)
+
+    def test_gzip_is_served_to_clients_that_accept_it(self, mock_get):
+        mock_get.return_value.json.return_value = {"description": "OpenLibrary data " * 100}
+        for _ in ("miss", "hit"):
+            response = self.client.get(self.url, headers={"accept-encoding": "gzip, br"})
+            self.assertEqual(response["Content-Encoding"], "gzip")
+            self.assertIn("Accept-Encoding", response["Vary"])
+            data = json.loads(gzip.decompress(response.content))
+            self.assertEqual(data["title"], "The Lord of the Rings")
+
+        plain = self.client.get(self.url, headers={"accept-encoding": "gzip;q=0"})
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertEqual(json.loads(plain.content)["title"], "The Lord of the Rings")
+
+
+class AcceptsGzipTests(TestCase):
+    def test_accept_encoding(self):
+        for header, accepted in (
+            ("", False),
+            ("gzip", True),
+            ("deflate, GZIP;q=0.5", True),
+            ("gzip;q=0, br", False),
+            ("*", True),
+            ("*, gzip;q=0", False),
+            ("identity", False),
+        ):
+            request = RequestFactory().get("/", headers={"accept-encoding": header})
+            self.assertEqual(accepts_gzip(request), accepted, header)
+
+
 class AttachDecoratorTests(TestCase):
     def test_attach_decorator_raises_attribute_error_for_missing_method(self):
         class DummyClass:
@@ -0,0 +1,89 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from books import instrumentation
+from books.cache import InstrumentedCacheMixin
+from books.models import Book
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
+
+
+class RequestTimingsTests(TestCase):
+    def test_timer_is_noop_without_active_request(self):
+        with instrumentation.timer("db"):
+            pass
+        self.assertIsNone(instrumentation.current_timings())
+
+    def test_timer_records_on_active_request(self):
+        timings, token = instrumentation.start_request_timings()
+        try:
+            with instrumentation.timer("db"):
+                pass
+            with instrumentation.timer("db"):
+                pass
+        finally:
+            instrumentation.stop_request_timings(token)
+
+        self.assertEqual(timings.metrics["db"].count, 2)
+        self.assertIn("db;dur=", timings.as_server_timing())
+        self.assertIn('desc="2 calls"', timings.as_server_timing())
+        self.assertIn("total;dur=", timings.as_server_timing())
+
+    def test_cache_records_hits_and_misses(self):
+        instrumented_cache = InstrumentedLocMemCache("instrumentation-tests", {})
+        timings, token = instrumentation.start_request_timings()
+        try:
+            instrumented_cache.get("missing")
+            instrumented_cache.set("present", "value")
+            self.assertEqual(instrumented_cache.get("present"), "value")
+            self.assertEqual(instrumented_cache.get("missing", "default"), "default")
+        finally:
+            instrumentation.stop_request_timings(token)
+
+        self.assertEqual(timings.metrics["cache-get"].outcomes, {"hit": 1, "miss": 2})
+        self.assertEqual(timings.metrics["cache-set"].count, 1)
+
+
+class ServerTimingMiddlewareTests(APITestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            isbn="9780544003415",
+            title="The Lord of the Rings",
+            author="J.R.R. Tolkien",
+            description="An epic fantasy novel",
+            publication_date="1954-07-29",
+        )
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1.0)
+    def test_sampled_request_has_server_timing_header(self):
+        with self.assertLogs("books.middleware", level="INFO") as logs:
+            response = self.client.get(reverse("book-list"))
+
+        self.assertIn("db;dur=", response["Server-Timing"])
+        self.assertIn("render;dur=", response["Server-Timing"])
+        self.assertIn("total;dur=", response["Server-Timing"])
+        self.assertIn("timings", logs.records[0].__dict__)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1.0)
+    @patch("httpx.get")
+    def test_openlibrary_call_is_timed(self, mock_get):
+        mock_get.return_value.json.return_value = {"title": "OpenLibrary Book"}
+        with self.assertLogs("books.middleware", level="INFO"):
+            response = self.client.get(reverse("book-detail", args=[self.book.isbn]))
+
+        self.assertIn("openlibrary;dur=", response["Server-Timing"])
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_request_has_no_header(self):
+        response = self.client.get(reverse("book-list"))
+        self.assertNotIn("Server-Timing", response)
+
+    def tearDown(self):
+        cache.clear()
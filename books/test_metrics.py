@@ -0,0 +1,79 @@
+import logging
+from unittest.mock import patch
+
+import httpx
+from django.core.cache import cache
+from django.urls import reverse
+from prometheus_client import REGISTRY
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from books.models import Book
+
+
+def sample_value(name, labels=None):
+    return REGISTRY.get_sample_value(name, labels or {}) or 0
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            isbn="9780544003415",
+            title="The Lord of the Rings",
+            author="J.R.R. Tolkien",
+            description="An epic fantasy novel",
+            publication_date="1954-07-29",
+        )
+        self.book_detail_url = reverse("book-detail", args=[self.book.isbn])
+
+    def test_metrics_endpoint_exports_prometheus_text(self):
+        self.client.get(reverse("book-list"))
+        response = self.client.get(reverse("metrics"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("books_request_duration_seconds_bucket", response.content.decode())
+        self.assertIn("books_db_queries_per_request", response.content.decode())
+
+    def test_request_latency_is_recorded_per_action(self):
+        labels = {"action": "list", "method": "GET", "status": "200"}
+        before = sample_value("books_request_duration_seconds_count", labels)
+        self.client.get(reverse("book-list"))
+        self.assertEqual(sample_value("books_request_duration_seconds_count", labels), before + 1)
+
+    def test_pagination_depth_is_recorded(self):
+        before = sample_value("books_pagination_page_number_count")
+        self.client.get(reverse("book-list"))
+        self.assertEqual(sample_value("books_pagination_page_number_count"), before + 1)
+
+    @patch("httpx.get")
+    def test_detail_cache_hit_miss_and_stale(self, mock_get):
+        mock_get.return_value.json.return_value = {"title": "OpenLibrary Book"}
+        before = {
+            outcome: sample_value("books_detail_cache_lookups_total", {"outcome": outcome})
+            for outcome in ("hit", "miss", "stale")
+        }
+
+        self.client.get(self.book_detail_url)
+        self.client.get(self.book_detail_url)
+        self.client.patch(self.book_detail_url, {"title": "Updated Title"})
+        self.client.get(self.book_detail_url)
+
+        for outcome in ("hit", "miss", "stale"):
+            self.assertEqual(
+                sample_value("books_detail_cache_lookups_total", {"outcome": outcome}), before[outcome] + 1
+            )
+
+    def test_openlibrary_outcome_is_recorded_per_exception(self):
+        labels = {"outcome": "TimeoutException"}
+        before = sample_value("books_openlibrary_request_duration_seconds_count", labels)
+        logging.disable(logging.CRITICAL)
+        try:
+            with patch("httpx.get", side_effect=httpx.TimeoutException("Request timed out")):
+                self.client.get(self.book_detail_url)
+        finally:
+            logging.disable(logging.NOTSET)
+
+        self.assertEqual(sample_value("books_openlibrary_request_duration_seconds_count", labels), before + 1)
+
+    def tearDown(self):
+        cache.clear()
@@ -0,0 +1,42 @@
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+
+class FullStackMiddlewareTests(APITestCase):
+    @override_settings(API_MODE=True)
+    def test_api_requests_skip_full_stack_in_api_mode(self):
+        response = self.client.get(reverse("book-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("X-Frame-Options", response)
+        self.assertFalse(hasattr(response.wsgi_request, "session"))
+
+    @override_settings(API_MODE=False)
+    def test_api_requests_run_full_stack_without_api_mode(self):
+        response = self.client.get(reverse("book-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("X-Frame-Options", response)
+        self.assertTrue(hasattr(response.wsgi_request, "session"))
+
+    @override_settings(API_MODE=True)
+    def test_admin_keeps_full_stack_in_api_mode(self):
+        response = self.client.get(reverse("admin:login"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("X-Frame-Options", response)
+        self.assertIn("csrftoken", response.cookies)
+
+    @override_settings(API_MODE=True)
+    def test_api_mode_skips_content_negotiation(self):
+        response = self.client.get(reverse("book-list"), headers={"accept": "text/html"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/json")
+
+    @override_settings(API_MODE=False)
+    def test_content_negotiation_without_api_mode(self):
+        response = self.client.get(reverse("book-list"), headers={"accept": "text/html"})
+        self.assertEqual(response.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+
+    def tearDown(self):
+        cache.clear()
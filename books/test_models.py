@@ -3,6 +3,14 @@ from datetime import date
 from django.core.exceptions import ValidationError
 from django.test import TestCase
 
+from books.isbn import (
+    INVALID_CHARACTER,
+    INVALID_CHECK_DIGIT,
+    INVALID_LENGTH,
+    VALID,
+    canonical_isbn,
+    validate_isbns,
+)
 from books.models import Book, somewhat_validate_isbn
 
 
@@ -78,3 +86,88 @@ class BookModelTests(TestCase):
         with self.assertRaises(ValidationError):
             book = Book(**invalid_book_data)
             book.full_clean()
+
+
+class ISBNFieldTests(TestCase):
+    def setUp(self):
+        self.book_data = {
+            "isbn": "0-7475-3269-9",
+            "title": "Test Book",
+            "author": "Test Author",
+            "description": "Test Description",
+            "publication_date": date(2023, 1, 1),
+        }
+
+    def test_canonical_isbn(self):
+        self.assertEqual(canonical_isbn("0747532699"), "9780747532699")
+        self.assertEqual(canonical_isbn("155404295x"), "9781554042951")
+        self.assertEqual(canonical_isbn("978-0-7475-3274-3"), "9780747532743")
+        # Check digits are not validated, only computed for ISBN-10s
+        self.assertEqual(canonical_isbn("9780747532744"), "9780747532744")
+        with self.assertRaises(ValueError):
+            canonical_isbn("12345")
+
+    def test_isbn_is_stored_in_canonical_form(self):
+        book = Book.objects.create(**self.book_data)
+        self.assertEqual(book.isbn, "9780747532699")
+        self.assertEqual(Book.objects.get().isbn, "9780747532699")
+
+    def test_lookup_accepts_both_forms(self):
+        Book.objects.create(**self.book_data)
+        self.assertTrue(Book.objects.filter(isbn="0747532699").exists())
+        self.assertTrue(Book.objects.filter(isbn="978-0-7475-3269-9").exists())
+        self.assertTrue(Book.objects.filter(isbn="9780747532699").exists())
+
+    def test_isbn_10_with_letters_in_body_is_invalid(self):
+        with self.assertRaises(ValidationError):
+            somewhat_validate_isbn("07475A2699")
+
+
+class BatchISBNValidationTests(TestCase):
+    isbns = (
+        "0747532699",
+        "155404295x",
+        "978-0-7475-3274-3",
+        "9780747532744",
+        "0747532698",
+        "12345",
+        "074753269A",
+        "978074753274X",
+        "97807475327\uff143",
+        "",
+    )
+
+    def test_lenient_mode_accepts_what_the_model_accepts(self):
+        codes = validate_isbns(self.isbns)
+
+        for isbn, code in zip(self.isbns, codes, strict=True):
+            try:
+                somewhat_validate_isbn(isbn)
+            except ValidationError:
+                self.assertNotEqual(code, VALID, isbn)
+            else:
+                self.assertEqual(code, VALID, isbn)
+
+    def test_error_codes(self):
+        self.assertEqual(
+            list(validate_isbns(self.isbns, strict=True)),
+            [
+                VALID,
+                VALID,
+                VALID,
+                INVALID_CHECK_DIGIT,
+                INVALID_CHECK_DIGIT,
+                INVALID_LENGTH,
+                INVALID_CHARACTER,
+                INVALID_CHARACTER,
+                INVALID_CHARACTER,
+                INVALID_LENGTH,
+            ],
+        )
+
+    def test_columns_of_one_length(self):
+        self.assertEqual(
+            list(validate_isbns(["9780747532743", "9780747532744", "9780544003415"], strict=True)),
+            [VALID, INVALID_CHECK_DIGIT, VALID],
+        )
+        self.assertEqual(validate_isbns([]), b"")
@@ -0,0 +1,60 @@
+import re
+
+from django.db import connection
+from django.test import TestCase
+
+from books import partitioning
+from books.models import Book
+
+
+class RelationSizesTests(TestCase):
+    def test_tables_that_are_not_partitioned_count_as_one(self):
+        with connection.cursor() as cursor:
+            count, _, indexes_size = partitioning.relation_sizes(cursor, "books_book")
+
+        self.assertEqual(count, 1)
+        # Even empty indexes have a metapage
+        self.assertGreater(indexes_size, 0)
+
+
+class PartitioningTests(TestCase):
+    # DDL is transactional in Postgres, so the conversion is rolled back after each test
+
+    def setUp(self):
+        for isbn in ("9780544003415", "9780547928227", "9780747532699"):
+            Book.objects.create(
+                isbn=isbn,
+                title="Title",
+                author="Author",
+                description="Description",
+                publication_date="2000-01-01",
+            )
+        with connection.cursor() as cursor:
+            partitioning.partition_by_hash(cursor, "books_book", "isbn", 4)
+
+    def test_rows_indexes_and_triggers_are_kept(self):
+        with connection.cursor() as cursor:
+            self.assertTrue(partitioning.is_partitioned(cursor, "books_book"))
+            self.assertEqual(partitioning.relation_sizes(cursor, "books_book")[0], 4)
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'books_book'")
+            indexes = {name for (name,) in cursor.fetchall()}
+            cursor.execute("SELECT tgname FROM pg_trigger WHERE tgrelid = 'books_book'::regclass AND NOT tgisinternal")
+            triggers = {name for (name,) in cursor.fetchall()}
+
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertIn("books_book_pkey", indexes)
+        self.assertIn("books_book_title_prefix_idx", indexes)
+        self.assertEqual(triggers, {"books_book_notify_change"})
+
+    def test_detail_lookups_read_one_partition(self):
+        plan = Book.objects.filter(isbn="9780544003415").explain()
+        self.assertEqual(len(set(re.findall(r"\bon (books_book_p\d+)\b", plan))), 1)
+
+    def test_writes_go_to_the_partitions(self):
+        Book.objects.filter(isbn="9780544003415").update(title="The Lord of the Rings")
+        Book.objects.get(isbn="9780547928227").delete()
+
+        self.assertEqual(
+            list(Book.objects.order_by("created_at").values_list("title", flat=True)),
+            ["The Lord of the Rings", "Title"],
+        )
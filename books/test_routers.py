@@ -0,0 +1,77 @@
+import time
+
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from books.middleware import ReadYourWritesMiddleware
+from books.models import Book
+from books.routers import (
+    PrimaryReplicaRouter,
+    pin_reads_to_primary,
+    reads_pinned_to_primary,
+)
+
+
+@override_settings(DATABASE_REPLICAS=["replica_0", "replica_1"])
+class PrimaryReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_go_to_replicas(self):
+        self.assertIn(self.router.db_for_read(Book), ["replica_0", "replica_1"])
+
+    def test_writes_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Book), DEFAULT_DB_ALIAS)
+
+    def test_pinned_reads_go_to_primary(self):
+        with pin_reads_to_primary():
+            self.assertEqual(self.router.db_for_read(Book), DEFAULT_DB_ALIAS)
+        self.assertIn(self.router.db_for_read(Book), ["replica_0", "replica_1"])
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_reads_go_to_primary_without_replicas(self):
+        self.assertEqual(self.router.db_for_read(Book), DEFAULT_DB_ALIAS)
+
+
+@override_settings(READ_YOUR_WRITES_SECONDS=5)
+class ReadYourWritesMiddlewareTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.pinned_during_request = None
+
+        def get_response(request):
+            self.pinned_during_request = reads_pinned_to_primary()
+            return HttpResponse(status=201 if request.method == "POST" else 200)
+
+        self.middleware = ReadYourWritesMiddleware(get_response)
+
+    def test_write_is_pinned_and_sets_cookie_and_header(self):
+        response = self.middleware(self.factory.post("/books/"))
+
+        self.assertTrue(self.pinned_during_request)
+        self.assertIn("last_write", response.cookies)
+        self.assertEqual(response.cookies["last_write"]["max-age"], 5)
+        self.assertIn("X-Last-Write", response)
+
+    def test_read_without_recent_write_is_not_pinned(self):
+        self.middleware(self.factory.get("/books/"))
+        self.assertFalse(self.pinned_during_request)
+
+    def test_read_after_write_with_cookie_is_pinned(self):
+        request = self.factory.get("/books/")
+        request.COOKIES["last_write"] = str(time.time())
+        self.middleware(request)
+        self.assertTrue(self.pinned_during_request)
+
+    def test_read_after_write_with_header_is_pinned(self):
+        self.middleware(self.factory.get("/books/", headers={"X-Last-Write": str(time.time())}))
+        self.assertTrue(self.pinned_during_request)
+
+    def test_read_after_window_is_not_pinned(self):
+        self.middleware(self.factory.get("/books/", headers={"X-Last-Write": str(time.time() - 10)}))
+        self.assertFalse(self.pinned_during_request)
+
+    def test_invalid_last_write_is_ignored(self):
+        self.middleware(self.factory.get("/books/", headers={"X-Last-Write": "yesterday"}))
+        self.assertFalse(self.pinned_during_request)
@@ -0,0 +1,70 @@
+import gzip
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.urls import reverse
+from drf_spectacular.generators import SchemaGenerator
+
+from books.schema import CachedSpectacularAPIView
+
+
+class CachedSchemaTests(TestCase):
+    def setUp(self):
+        CachedSpectacularAPIView.clear_cache()
+        self.schema_url = reverse("schema")
+
+    def test_schema_is_generated_once(self):
+        with patch.object(SchemaGenerator, "get_schema", autospec=True, side_effect=SchemaGenerator.get_schema) as spy:
+            first = self.client.get(self.schema_url)
+            second = self.client.get(self.schema_url)
+
+        self.assertEqual(spy.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        self.assertIn(b"/books/", first.content)
+
+    def test_formats_are_cached_separately(self):
+        yaml_response = self.client.get(self.schema_url)
+        json_response = self.client.get(self.schema_url, headers={"accept": "application/vnd.oai.openapi+json"})
+
+        self.assertTrue(yaml_response["Content-Type"].startswith("application/vnd.oai.openapi"))
+        self.assertTrue(json_response["Content-Type"].startswith("application/vnd.oai.openapi+json"))
+        self.assertNotEqual(yaml_response["ETag"], json_response["ETag"])
+
+    def test_if_none_match_returns_not_modified(self):
+        etag = self.client.get(self.schema_url)["ETag"]
+        response = self.client.get(self.schema_url, headers={"if-none-match": etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_gzip_is_served_when_accepted(self):
+        plain = self.client.get(self.schema_url)
+        gzipped = self.client.get(self.schema_url, headers={"accept-encoding": "gzip, deflate"})
+
+        self.assertEqual(gzipped["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(gzipped.content), plain.content)
+        self.assertIn("Accept-Encoding", gzipped["Vary"])
+
+    def test_gzip_has_its_own_etag(self):
+        plain = self.client.get(self.schema_url)
+        gzipped = self.client.get(self.schema_url, headers={"accept-encoding": "gzip"})
+
+        self.assertNotEqual(gzipped["ETag"], plain["ETag"])
+        for accept_encoding, etag in (("", plain["ETag"]), ("gzip", gzipped["ETag"])):
+            headers = {"accept-encoding": accept_encoding, "if-none-match": etag}
+            response = self.client.get(self.schema_url, headers=headers)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response["ETag"], etag)
+
+    def test_etag_of_the_other_representation_does_not_match(self):
+        plain = self.client.get(self.schema_url)
+        gzipped = self.client.get(self.schema_url, headers={"accept-encoding": "gzip"})
+
+        response = self.client.get(self.schema_url, headers={"accept-encoding": "gzip", "if-none-match": plain["ETag"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], gzipped["ETag"])
+
+        response = self.client.get(self.schema_url, headers={"if-none-match": gzipped["ETag"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], plain["ETag"])
+        self.assertEqual(response.content, plain.content)
@@ -0,0 +1,28 @@
+from django.test import TestCase
+
+from books.schema import CachedSpectacularAPIView
+from books.startup import import_times, warm_up
+
+
+class WarmUpTests(TestCase):
+    def setUp(self):
+        CachedSpectacularAPIView.clear_cache()
+
+    def test_schema_is_rendered_without_queries(self):
+        with self.assertNumQueries(0):
+            warm_up()
+
+        self.assertEqual(len(CachedSpectacularAPIView._rendered_schemas), 2)  # noqa: SLF001
+
+
+class ImportTimesTests(TestCase):
+    def test_times_are_grouped_by_package(self):
+        lines = [
+            "import time: self [us] | cumulative | imported package",
+            "import time:       100 |        100 |     httpcore._api",
+            "import time:       300 |        400 |   httpcore",
+            "import time:        50 |        450 | httpx",
+            "import time:      1000 |       1000 | django.db.models",
+        ]
+
+        self.assertEqual(import_times(lines), {"httpcore": 400, "httpx": 50, "django": 1000})
@@ -0,0 +1,128 @@
+from collections import Counter
+from unittest.mock import patch
+
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from books import stats
+from books.models import Book, BookCountByAuthor, BookCountByYear
+
+
+def create_book(isbn, author, publication_date):
+    return Book.objects.create(
+        isbn=isbn,
+        title="Title",
+        author=author,
+        description="Description",
+        publication_date=publication_date,
+    )
+
+
+class CatalogStatsTests(TestCase):
+    def setUp(self):
+        self.hobbit = create_book("9780547928227", "J.R.R. Tolkien", "1937-09-21")
+        create_book("9780544003415", "J.R.R. Tolkien", "1954-07-29")
+        create_book("9780747532699", "J.K. Rowling", "1997-06-26")
+
+    def counts(self):
+        return (
+            dict(BookCountByAuthor.objects.filter(books__gt=0).values_list("author", "books")),
+            dict(BookCountByYear.objects.filter(books__gt=0).values_list("year", "books")),
+        )
+
+    def test_creates_are_counted(self):
+        self.assertEqual(
+            self.counts(),
+            ({"J.R.R. Tolkien": 2, "J.K. Rowling": 1}, {1937: 1, 1954: 1, 1997: 1}),
+        )
+
+    def test_updates_move_counts(self):
+        book = Book.objects.get(isbn="9780547928227")
+        book.author = "Tolkien"
+        book.publication_date = "1954-01-01"
+        book.save()
+
+        self.assertEqual(
+            self.counts(),
+            ({"J.R.R. Tolkien": 1, "Tolkien": 1, "J.K. Rowling": 1}, {1954: 2, 1997: 1}),
+        )
+
+    def test_updates_of_other_fields_do_not_write_counts(self):
+        book = Book.objects.get(isbn="9780547928227")
+        book.title = "The Hobbit"
+        with self.assertNumQueries(1):
+            book.save()
+
+    def test_updates_of_partially_loaded_books_move_counts(self):
+        book = Book.objects.only("isbn").get(isbn="9780547928227")
+        book.author = "Tolkien"
+        book.save()
+
+        self.assertEqual(self.counts()[0], {"J.R.R. Tolkien": 1, "Tolkien": 1, "J.K. Rowling": 1})
+
+    def test_deletes_are_counted(self):
+        Book.objects.filter(author="J.R.R. Tolkien").delete()
+        self.hobbit.delete()
+
+        self.assertEqual(self.counts(), ({"J.K. Rowling": 1}, {1997: 1}))
+
+    def test_counts_are_moved_in_a_deterministic_order(self):
+        with CaptureQueriesContext(connection) as queries:
+            stats.apply_deltas(
+                Counter({("J.R.R. Tolkien", 1954): 1, ("J.K. Rowling", 1997): 1, ("J.R.R. Tolkien", 1937): 1})
+            )
+
+        updates = [query["sql"] for query in queries if query["sql"].startswith("UPDATE")]
+        for sql, key in zip(updates, ["'J.K. Rowling'", "'J.R.R. Tolkien'", "= 1937", "= 1954", "= 1997"], strict=True):
+            self.assertIn(key, sql)
+
+    def test_failed_count_updates_roll_back_the_write(self):
+        book = Book.objects.get(isbn="9780547928227")
+        book.author = "Tolkien"
+        with (
+            patch("books.stats.apply_deltas", side_effect=DatabaseError),
+            self.assertRaises(DatabaseError),
+            transaction.atomic(),
+        ):
+            book.save()
+
+        self.assertEqual(Book.objects.get(isbn="9780547928227").author, "J.R.R. Tolkien")
+        self.assertEqual(self.counts()[0], {"J.R.R. Tolkien": 2, "J.K. Rowling": 1})
+
+    def test_rebuild_matches_incremental_counts(self):
+        Book.objects.get(isbn="9780747532699").delete()
+        counts = self.counts()
+
+        stats.rebuild()
+
+        self.assertEqual(self.counts(), counts)
+
+
+class CatalogStatsEndpointTests(APITestCase):
+    def setUp(self):
+        create_book("9780547928227", "J.R.R. Tolkien", "1937-09-21")
+        create_book("9780544003415", "J.R.R. Tolkien", "1954-07-29")
+        create_book("9780747532699", "J.K. Rowling", "1997-06-26")
+        create_book("9780747538493", "J.K. Rowling", "1998-07-02")
+        create_book("9780439136365", "J.K. Rowling", "1999-07-08")
+
+    def test_stats(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("book-stats"), {"top_authors": 1})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total"], 5)
+        self.assertEqual(
+            response.data["by_decade"],
+            [{"decade": 1930, "books": 1}, {"decade": 1950, "books": 1}, {"decade": 1990, "books": 3}],
+        )
+        self.assertEqual([row["year"] for row in response.data["by_year"]], [1937, 1954, 1997, 1998, 1999])
+        self.assertEqual(response.data["top_authors"], [{"author": "J.K. Rowling", "books": 3}])
+
+    def test_invalid_top_authors(self):
+        response = self.client.get(reverse("book-stats"), {"top_authors": "1001"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
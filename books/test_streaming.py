@@ -0,0 +1,189 @@
+import json
+from datetime import UTC, datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from books.changes import changes_after, decode_cursor, encode_cursor
+from books.models import Book, BookTombstone
+from books.streaming import ChangeBroadcaster, change_events, notification_event
+
+
+def parse_event(event):
+    fields = dict(line.split(": ", 1) for line in event.strip().split("\n"))
+    return fields["id"], json.loads(fields["data"])
+
+
+class NotificationEventTests(TestCase):
+    def test_trigger_payload_becomes_event_with_cursor(self):
+        event_id, data = parse_event(
+            notification_event('{"op" : "d", "isbn" : 9780544003415, "at" : "2026-10-19T03:27:00.123456+00:00"}')
+        )
+
+        changed_at = datetime(2026, 10, 19, 3, 27, 0, 123456, tzinfo=UTC)
+        self.assertEqual(data, {"isbn": "9780544003415", "deleted": True, "changed_at": changed_at.isoformat()})
+        self.assertEqual(decode_cursor(event_id), (changed_at, "9780544003415"))
+
+
+class TriggerNotificationTests(TransactionTestCase):
+    # Notifications are sent on commit, so the test can't run in a transaction
+    def setUp(self):
+        self.payloads = []
+        with connection.cursor() as cursor:
+            cursor.execute("LISTEN book_changes")
+        # Notifications received while running a query only go to the handlers
+        connection.connection.add_notify_handler(self.receive)
+
+    def tearDown(self):
+        connection.connection.remove_notify_handler(self.receive)
+        with connection.cursor() as cursor:
+            cursor.execute("UNLISTEN book_changes")
+
+    def receive(self, notify):
+        self.payloads.append(notify.payload)
+
+    def notifications(self, count):
+        # The last ones can arrive after the last query
+        if missing := count - len(self.payloads):
+            for notify in connection.connection.notifies(timeout=1, stop_after=missing):
+                self.receive(notify)
+        payloads, self.payloads = self.payloads[:count], self.payloads[count:]
+        return payloads
+
+    def test_changes_are_notified(self):
+        book = Book.objects.create(isbn="9780544003415", title="The Lord of the Rings", publication_date="1954-07-29")
+        book.title = "The Fellowship of the Ring"
+        book.save()
+
+        events = [parse_event(notification_event(payload)) for payload in self.notifications(2)]
+
+        book.refresh_from_db()
+        self.assertEqual([data["isbn"] for _, data in events], [book.isbn, book.isbn])
+        self.assertEqual(decode_cursor(events[-1][0]), (book.updated_at, book.isbn))
+
+    def test_deletes_are_notified_with_their_tombstone(self):
+        Book.objects.create(isbn="9780544003415", title="The Lord of the Rings", publication_date="1954-07-29")
+        Book.objects.create(isbn="9780261103573", title="The Hobbit", publication_date="1937-09-21")
+        self.notifications(2)
+
+        Book.objects.get(isbn="9780544003415").delete()
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM books_book WHERE isbn = %s", ["9780261103573"])
+
+        events = [parse_event(notification_event(payload)) for payload in self.notifications(2)]
+
+        self.assertTrue(all(data["deleted"] for _, data in events))
+        tombstones = BookTombstone.objects.order_by("deleted_at")
+        self.assertEqual(
+            [decode_cursor(event_id) for event_id, _ in events],
+            [(tombstone.deleted_at, tombstone.isbn) for tombstone in tombstones],
+        )
+
+
+class ChangeBroadcasterTests(TestCase):
+    async def test_events_are_fanned_out_to_every_subscriber(self):
+        broadcaster = ChangeBroadcaster(max_queue_size=10)
+        first, second = broadcaster.subscribe(), broadcaster.subscribe()
+
+        broadcaster.publish("event")
+
+        self.assertEqual(first.queue.get_nowait(), "event")
+        self.assertEqual(second.queue.get_nowait(), "event")
+
+    async def test_subscribers_that_fall_behind_are_dropped(self):
+        broadcaster = ChangeBroadcaster(max_queue_size=2)
+        slow, fast = broadcaster.subscribe(), broadcaster.subscribe()
+
+        for event in ("first", "second"):
+            broadcaster.publish(event)
+            fast.queue.get_nowait()
+        broadcaster.publish("third")
+
+        self.assertEqual(broadcaster.subscriptions, {fast})
+        self.assertIsNone(slow.queue.get_nowait())
+        self.assertEqual(fast.queue.get_nowait(), "third")
+
+
+@override_settings(CHANGE_FEED_DELAY_SECONDS=0)
+class ChangeEventsTests(TestCase):
+    def setUp(self):
+        for isbn in ("9780544003415", "9780547928227"):
+            Book.objects.create(
+                isbn=isbn,
+                title=f"Book {isbn}",
+                author="Author",
+                description="Description",
+                publication_date="2000-01-01",
+            )
+
+    async def test_resume_replays_missed_changes_then_streams_live_events(self):
+        [first_change], _ = await sync_to_async(changes_after)(None, 1)
+        broadcaster = ChangeBroadcaster(max_queue_size=10)
+        events = change_events(broadcaster, first_change.position)
+
+        self.assertTrue((await anext(events)).startswith("retry:"))
+        event_id, data = parse_event(await anext(events))
+        self.assertEqual(data["isbn"], "9780547928227")
+        self.assertFalse(data["deleted"])
+
+        broadcaster.publish("live event")
+        self.assertEqual(await anext(events), "live event")
+
+        broadcaster.drop_all()
+        with self.assertRaises(StopAsyncIteration):
+            await anext(events)
+        self.assertEqual(broadcaster.subscriptions, set())
+
+    @override_settings(CHANGE_FEED_DELAY_SECONDS=10)
+    async def test_resume_replays_changes_committed_out_of_order(self):
+        # The first book was saved before the second, in a transaction that committed after it: the client got the
+        # event of the second book first, and resumes from it
+        now = timezone.now()
+        await Book.objects.filter(isbn="9780544003415").aupdate(updated_at=now - timedelta(seconds=5))
+        await Book.objects.filter(isbn="9780547928227").aupdate(updated_at=now - timedelta(seconds=2))
+        events = change_events(ChangeBroadcaster(max_queue_size=10), (now - timedelta(seconds=2), "9780547928227"))
+
+        await anext(events)
+        replayed = [parse_event(await anext(events))[1]["isbn"] for _ in range(2)]
+
+        self.assertEqual(replayed, ["9780544003415", "9780547928227"])
+        await events.aclose()
+
+    @override_settings(CHANGE_STREAM_HEARTBEAT_SECONDS=0)
+    async def test_idle_stream_sends_heartbeats(self):
+        events = change_events(ChangeBroadcaster(max_queue_size=10), None)
+        await anext(events)
+        self.assertEqual(await anext(events), ": heartbeat\n\n")
+        await events.aclose()
+
+
+class StreamChangesViewTests(TestCase):
+    def setUp(self):
+        self.stream_url = reverse("book-changes-stream")
+
+    def test_refused_under_wsgi(self):
+        response = self.client.get(self.stream_url)
+        self.assertEqual(response.status_code, 501)
+
+    async def test_invalid_cursor_is_rejected(self):
+        response = await AsyncClient().get(self.stream_url, headers={"Last-Event-ID": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_streams_events(self):
+        broadcaster = ChangeBroadcaster(max_queue_size=10)
+        broadcaster.start = AsyncMock()
+        cursor = encode_cursor((datetime(2026, 10, 19, tzinfo=UTC), "9780544003415"))
+        with patch("books.streaming.get_broadcaster", return_value=broadcaster):
+            response = await AsyncClient().get(self.stream_url, {"cursor": cursor})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        content = aiter(response.streaming_content)
+        self.assertTrue((await anext(content)).startswith(b"retry:"))
+        broadcaster.drop_all()
+        with self.assertRaises(StopAsyncIteration):
+            await anext(content)
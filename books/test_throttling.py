@@ -0,0 +1,97 @@
+import logging
+import uuid
+from unittest.mock import patch
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from books.models import Book
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": rates})
+
+
+class ThrottlingTests(APITestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            isbn="9780544003415",
+            title="The Lord of the Rings",
+            author="J.R.R. Tolkien",
+            description="An epic fantasy novel",
+            publication_date="1954-07-29",
+        )
+        self.books_url = reverse("book-list")
+        self.book_detail_url = reverse("book-detail", args=[self.book.isbn])
+        # Each test is a different client, so they don't share budgets
+        self.use_new_ip_address()
+
+    def use_new_ip_address(self):
+        self.client.defaults["REMOTE_ADDR"] = ".".join(str(byte) for byte in uuid.uuid4().bytes[:4])
+
+    @throttle_rates(**{"books-cheap": "2/min"})
+    def test_cheap_budget_is_enforced_with_retry_after(self):
+        self.assertEqual(self.client.get(self.books_url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.books_url).status_code, status.HTTP_200_OK)
+        response = self.client.get(self.books_url)
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertTrue(0 < int(response["Retry-After"]) <= 60)  # noqa: PLR2004
+
+    @throttle_rates(**{"books-cheap": "1/min"})
+    def test_budgets_are_per_client_and_per_action(self):
+        self.assertEqual(self.client.get(self.books_url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.book_detail_url, {"fields": "isbn"}).status_code, status.HTTP_200_OK)
+
+        self.use_new_ip_address()
+        self.assertEqual(self.client.get(self.books_url).status_code, status.HTTP_200_OK)
+
+    @throttle_rates(**{"books-cheap": "1/min"})
+    def test_client_headers_do_not_give_new_budgets(self):
+        self.assertEqual(self.client.get(self.books_url).status_code, status.HTTP_200_OK)
+        response = self.client.get(self.books_url, headers={"X-Client-Id": uuid.uuid4().hex})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @throttle_rates(**{"books-cheap": "100/min", "books-expensive": "1/min"})
+    @patch("httpx.get")
+    def test_expensive_budget_only_applies_to_cache_misses(self, mock_get):
+        mock_get.return_value.json.return_value = {"title": "OpenLibrary Book"}
+        self.assertEqual(self.client.get(self.book_detail_url).status_code, status.HTTP_200_OK)
+        # Cache hit
+        self.assertEqual(self.client.get(self.book_detail_url).status_code, status.HTTP_200_OK)
+        # Uncached variant
+        response = self.client.get(self.book_detail_url, {"fields": "isbn,raw_openlibrary_data"})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", response)
+
+    @throttle_rates(**{"books-cheap": "100/min", "books-expensive": "1/min"})
+    def test_deep_pages_use_expensive_budget(self):
+        self.assertEqual(self.client.get(self.books_url, {"page": 1}).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.books_url, {"page": 1}).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.books_url, {"page": 101}).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(self.books_url, {"page": 102})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @throttle_rates(**{"books-cheap": "100/min", "books-expensive": "1/min"})
+    def test_last_page_uses_expensive_budget(self):
+        self.assertEqual(self.client.get(self.books_url, {"page": "last"}).status_code, status.HTTP_200_OK)
+        response = self.client.get(self.books_url, {"page": "last"})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @throttle_rates(**{"books-cheap": "1/min"})
+    def test_requests_are_allowed_when_redis_is_down(self):
+        logging.disable(logging.CRITICAL)
+        try:
+            with patch("books.throttling.sliding_window", side_effect=redis.ConnectionError("Redis is down")):
+                self.assertEqual(self.client.get(self.books_url).status_code, status.HTTP_200_OK)
+                self.assertEqual(self.client.get(self.books_url).status_code, status.HTTP_200_OK)
+        finally:
+            logging.disable(logging.NOTSET)
+
+    def tearDown(self):
+        cache.clear()
@@ -1,15 +1,22 @@
+import base64
 import logging
+from datetime import timedelta
 from json import JSONDecodeError
 from unittest.mock import patch
 
 import httpx
 from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.dateparse import parse_date
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from books.models import Book
+from books.changes import _after
+from books.models import ArchivedBook, Book, BookCountByAuthor, BookTombstone
 
 
 class BasicCRUDTests(APITestCase):
@@ -233,6 +240,42 @@ class TestExternalData(APITestCase):
             timeout=2
         )
 
+    @patch("httpx.get")
+    def test_openlibrary_data_is_trimmed_before_caching(self, mock_get):
+        mock_get.return_value.json.return_value = {
+            "title": "OpenLibrary Book",
+            "source_records": ["ia:openlibrarybook"] * 50,
+        }
+        url = reverse("book-detail", args=[self.book.isbn])
+
+        response = self.client.get(url)
+        self.assertEqual(response.data["raw_openlibrary_data"], {"title": "OpenLibrary Book"})
+
+        mock_get.return_value.json.return_value = {}
+        response = self.client.get(url)
+        self.assertNotIn(b"source_records", response.content)
+
+    @patch("httpx.get")
+    @override_settings(OPENLIBRARY_FIELDS=["*"])
+    def test_all_openlibrary_fields(self, mock_get):
+        mock_get.return_value.json.return_value = {"title": "OpenLibrary Book", "source_records": []}
+        response = self.client.get(reverse("book-detail", args=[self.book.isbn]))
+        self.assertEqual(response.data["raw_openlibrary_data"], {"title": "OpenLibrary Book", "source_records": []})
+
+    @patch("httpx.get")
+    def test_openlibrary_fields_query_parameter(self, mock_get):
+        mock_get.return_value.json.return_value = {"title": "OpenLibrary Book", "source_records": [], "covers": [1]}
+        url = reverse("book-detail", args=[self.book.isbn])
+
+        response = self.client.get(url, {"openlibrary_fields": "source_records, covers"})
+        self.assertEqual(response.data["raw_openlibrary_data"], {"source_records": [], "covers": [1]})
+
+        response = self.client.get(url, {"openlibrary_fields": "*"})
+        self.assertEqual(len(response.data["raw_openlibrary_data"]), 3)
+
+        response = self.client.get(url, {"openlibrary_fields": ","})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def tearDown(self):
         cache.clear()
 
@@ -352,3 +395,364 @@ class TestHttpxExceptions(APITestCase):
     def tearDown(self):
         logging.disable(logging.NOTSET)
         cache.clear()
+
+
+class SparseFieldsetsTests(APITestCase):
+    def setUp(self):
+        self.book_data = {
+            "isbn": "9780544003415",
+            "title": "The Lord of the Rings",
+            "author": "J.R.R. Tolkien",
+            "description": "An epic fantasy novel",
+            "publication_date": "1954-07-29",
+        }
+        self.book = Book.objects.create(**self.book_data)
+        self.books_url = reverse("book-list")
+        self.book_detail_url = reverse("book-detail", args=[self.book.isbn])
+
+    def test_list_returns_only_requested_fields(self):
+        response = self.client.get(f"{self.books_url}?fields=isbn,title,author")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["results"][0],
+            {"isbn": self.book_data["isbn"], "title": self.book_data["title"], "author": self.book_data["author"]},
+        )
+
+    def test_list_loads_only_requested_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f"{self.books_url}?fields=title")
+        select = next(query["sql"] for query in queries.captured_queries if "LIMIT" in query["sql"])
+        self.assertIn('"title"', select)
+        self.assertNotIn('"description"', select)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(f"{self.books_url}?fields=isbn,unknown")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_empty_fields_is_rejected(self):
+        response = self.client.get(f"{self.books_url}?fields=")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_openlibrary_field_is_not_allowed_on_list(self):
+        response = self.client.get(f"{self.books_url}?fields=isbn,raw_openlibrary_data")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch("httpx.get")
+    def test_retrieve_without_openlibrary_field_skips_external_call(self, mock_get):
+        response = self.client.get(f"{self.book_detail_url}?fields=isbn,title")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"isbn": self.book_data["isbn"], "title": self.book_data["title"]})
+        mock_get.assert_not_called()
+
+    @patch("httpx.get")
+    def test_retrieve_with_openlibrary_field(self, mock_get):
+        mock_get.return_value.json.return_value = {"title": "OpenLibrary Book"}
+        response = self.client.get(f"{self.book_detail_url}?fields=isbn,raw_openlibrary_data")
+        self.assertEqual(
+            response.data, {"isbn": self.book_data["isbn"], "raw_openlibrary_data": {"title": "OpenLibrary Book"}}
+        )
+
+    @patch("httpx.get")
+    def test_openlibrary_data_is_cached_for_every_query_string(self, mock_get):
+        mock_get.return_value.json.return_value = {"title": "OpenLibrary Book", "covers": [1]}
+        self.client.get(self.book_detail_url)
+        for query in ({"fields": "isbn,raw_openlibrary_data"}, {"openlibrary_fields": "covers"}):
+            for _ in range(2):
+                response = self.client.get(self.book_detail_url, query)
+                self.assertIn("raw_openlibrary_data", response.data)
+        self.assertEqual(response.data["raw_openlibrary_data"], {"covers": [1]})
+        mock_get.assert_called_once()
+
+    @patch("httpx.get")
+    def test_openlibrary_data_is_fetched_again_after_a_bulk_update(self, mock_get):
+        mock_get.return_value.json.return_value = {"title": "OpenLibrary Book"}
+        url = f"{self.book_detail_url}?fields=raw_openlibrary_data"
+        self.client.get(url)
+
+        mock_get.return_value.json.return_value = {"title": "Updated OpenLibrary Book"}
+        self.client.patch(
+            reverse("book-bulk-partial-update"), {"isbns": [self.book.isbn], "changes": {"title": "Updated Title"}}, format="json"
+        )
+
+        self.assertEqual(self.client.get(url).data["raw_openlibrary_data"], {"title": "Updated OpenLibrary Book"})
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch("httpx.get")
+    def test_retrieve_with_fields_is_not_cached(self, mock_get):
+        mock_get.return_value.json.return_value = {"title": "OpenLibrary Book"}
+        self.client.get(f"{self.book_detail_url}?fields=title")
+        self.client.patch(self.book_detail_url, {"title": "Updated Title"})
+        response = self.client.get(f"{self.book_detail_url}?fields=title")
+        self.assertEqual(response.data, {"title": "Updated Title"})
+
+    def tearDown(self):
+        cache.clear()
+
+
+class ISBNEquivalenceTests(APITestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            isbn="0747532699",
+            title="Harry Potter and the Philosopher's Stone",
+            author="J.K. Rowling",
+            description="A fantasy novel",
+            publication_date="1997-06-26",
+        )
+
+    def test_isbn_10_is_returned_as_isbn_13(self):
+        response = self.client.get(reverse("book-detail", args=["9780747532699"]), {"fields": "isbn"})
+        self.assertEqual(response.data["isbn"], "9780747532699")
+
+    def test_detail_accepts_isbn_10_and_hyphens(self):
+        for isbn in ("0747532699", "0-7475-3269-9", "978-0-7475-3269-9"):
+            response = self.client.get(reverse("book-detail", args=[isbn]), {"fields": "isbn"})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data["isbn"], "9780747532699")
+
+    def test_put_accepts_any_form_of_the_isbn(self):
+        for isbn in ("0747532699", "978-0-7475-3269-9", "9780747532699"):
+            response = self.client.put(
+                reverse("book-detail", args=["9780747532699"]),
+                {
+                    "isbn": isbn,
+                    "title": "Harry Potter and the Philosopher's Stone",
+                    "author": "J.K. Rowling",
+                    "description": f"Updated with {isbn}",
+                    "publication_date": "1997-06-26",
+                },
+                format="json",
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data["isbn"], "9780747532699")
+
+        response = self.client.put(
+            reverse("book-detail", args=["9780747532699"]),
+            {
+                "isbn": "9780544003415",
+                "title": "The Lord of the Rings",
+                "author": "J.R.R. Tolkien",
+                "description": "A fantasy novel",
+                "publication_date": "1954-07-29",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_isbn_lookup_is_not_found(self):
+        response = self.client.get(reverse("book-detail", args=["not-an-isbn"]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_create_with_other_form_is_duplicate(self):
+        response = self.client.post(
+            reverse("book-list"),
+            {
+                "isbn": "978-0-7475-3269-9",
+                "title": "Harry Potter and the Philosopher's Stone",
+                "author": "J.K. Rowling",
+                "description": "A fantasy novel",
+                "publication_date": "1997-06-26",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch("httpx.get")
+    def test_update_through_isbn_10_invalidates_canonical_cache(self, mock_get):
+        mock_get.return_value.json.return_value = {"title": "OpenLibrary Book"}
+        canonical_url = reverse("book-detail", args=["9780747532699"])
+        self.client.get(canonical_url)
+        self.client.patch(reverse("book-detail", args=["0747532699"]), {"title": "Updated Title"})
+
+        response = self.client.get(canonical_url)
+        self.assertEqual(response.data["title"], "Updated Title")
+
+    def tearDown(self):
+        cache.clear()
+
+
+@override_settings(CHANGE_FEED_DELAY_SECONDS=0)
+class ChangeFeedTests(APITestCase):
+    def setUp(self):
+        self.changes_url = reverse("book-changes")
+        for isbn in ("9780544003415", "9780547928227", "9780747532699"):
+            Book.objects.create(
+                isbn=isbn,
+                title=f"Book {isbn}",
+                author="Author",
+                description="Description",
+                publication_date="2000-01-01",
+            )
+
+    def read_feed(self, cursor=None, limit=None):
+        params = {key: value for key, value in (("cursor", cursor), ("limit", limit)) if value is not None}
+        response = self.client.get(self.changes_url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_pages_through_every_book(self):
+        first_page = self.read_feed(limit=2)
+        self.assertEqual([change["isbn"] for change in first_page["results"]], ["9780544003415", "9780547928227"])
+        self.assertTrue(first_page["has_more"])
+        self.assertEqual(first_page["results"][0]["book"]["title"], "Book 9780544003415")
+
+        second_page = self.read_feed(cursor=first_page["cursor"], limit=2)
+        self.assertEqual([change["isbn"] for change in second_page["results"]], ["9780747532699"])
+        self.assertFalse(second_page["has_more"])
+
+        empty_page = self.read_feed(cursor=second_page["cursor"])
+        self.assertEqual(empty_page["results"], [])
+        self.assertEqual(empty_page["cursor"], second_page["cursor"])
+
+    def test_returns_only_changes_after_cursor(self):
+        cursor = self.read_feed()["cursor"]
+        self.client.patch(reverse("book-detail", args=["9780544003415"]), {"title": "Updated Title"})
+        Book.objects.filter(isbn="9780547928227").delete()
+
+        changes = self.read_feed(cursor=cursor)["results"]
+        self.assertEqual([change["isbn"] for change in changes], ["9780544003415", "9780547928227"])
+        self.assertEqual(changes[0]["book"]["title"], "Updated Title")
+        self.assertFalse(changes[0]["deleted"])
+        self.assertTrue(changes[1]["deleted"])
+        self.assertIsNone(changes[1]["book"])
+
+    def test_deleted_books_leave_a_tombstone(self):
+        self.client.delete(reverse("book-detail", args=["9780747532699"]))
+        self.assertTrue(BookTombstone.objects.filter(isbn="9780747532699").exists())
+
+        changes = self.read_feed()["results"]
+        self.assertEqual([change["isbn"] for change in changes][-1], "9780747532699")
+        self.assertTrue(changes[-1]["deleted"])
+
+    def test_each_page_is_three_queries(self):
+        cursor = self.read_feed(limit=1)["cursor"]
+        with CaptureQueriesContext(connection) as queries:
+            self.read_feed(cursor=cursor, limit=1)
+        # Books, archived books and tombstones
+        self.assertEqual(len(queries), 3)
+
+    def test_pages_are_index_range_scans_starting_at_the_cursor(self):
+        position = (timezone.now() - timedelta(days=1), "9780544003415")
+        with connection.cursor() as cursor:
+            # The tables are too small for their indexes to be worth it otherwise
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            for queryset, timestamp_field in (
+                (Book.objects.all(), "updated_at"),
+                (ArchivedBook.objects.all(), "updated_at"),
+                (BookTombstone.objects.all(), "deleted_at"),
+            ):
+                plan = _after(queryset, timestamp_field, position, timezone.now())[:10].explain()
+                [index_condition] = [line for line in plan.splitlines() if "Index Cond" in line]
+                self.assertIn(f"{timestamp_field} >=", index_condition)
+
+    @override_settings(CHANGE_FEED_DELAY_SECONDS=60)
+    def test_recent_changes_are_not_returned_yet(self):
+        self.assertEqual(self.read_feed()["results"], [])
+
+    def test_invalid_parameters(self):
+        forged_cursor = base64.urlsafe_b64encode(b'["2020-01-01T00:00:00+00:00", "abc"]').decode()
+        for params in (
+            {"cursor": "not-a-cursor"},
+            {"cursor": forged_cursor},
+            {"limit": "0"},
+            {"limit": "1001"},
+            {"limit": "ten"},
+        ):
+            response = self.client.get(self.changes_url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkTests(APITestCase):
+    def setUp(self):
+        for isbn, author in (("9780544003415", "Tolkein"), ("9780547928227", "Tolkein"), ("9780747532699", "J.K. Rowling")):
+            Book.objects.create(
+                isbn=isbn,
+                title=f"Book {isbn}",
+                author=author,
+                description="Description",
+                publication_date="1954-07-29",
+            )
+        self.bulk_url = reverse("book-bulk-partial-update")
+        self.bulk_delete_url = reverse("book-bulk-destroy")
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_bulk_partial_update(self):
+        response = self.client.patch(
+            self.bulk_url,
+            {"isbns": ["9780544003415", "0-547-92822-9", "9780000000002", "nope"], "changes": {"author": "J.R.R. Tolkien"}},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(
+            [result["result"] for result in response.data["results"]], ["updated", "updated", "not_found", "invalid"]
+        )
+        self.assertEqual(Book.objects.filter(author="J.R.R. Tolkien").count(), 2)
+        self.assertEqual(
+            dict(BookCountByAuthor.objects.filter(books__gt=0).values_list("author", "books")),
+            {"J.R.R. Tolkien": 2, "J.K. Rowling": 1},
+        )
+
+    def test_bulk_partial_update_is_a_single_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(
+                self.bulk_url,
+                {"isbns": ["9780544003415", "9780547928227"], "changes": {"title": "Fixed"}},
+                format="json",
+            )
+        updates = [query for query in queries if query["sql"].startswith('UPDATE "books_book"')]
+        self.assertEqual(len(updates), 1)
+
+    def test_bulk_delete_does_not_depend_on_the_number_of_books(self):
+        isbns = ["9780544003415", "9780547928227", "9780747532699"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.bulk_delete_url, {"isbns": isbns}, format="json")
+
+        self.assertEqual(response.data["count"], 3)
+        statements = [query["sql"] for query in queries if "SAVEPOINT" not in query["sql"]]
+        self.assertEqual(len([sql for sql in statements if sql.startswith('DELETE FROM "books_book"')]), 1)
+        # Looking for archived books, locking the books, deleting them (the trigger writes the tombstones), then one
+        # statement per author and per year
+        self.assertEqual(len(statements), 3 + 2 + 1)
+        self.assertEqual(set(BookTombstone.objects.values_list("isbn", flat=True)), set(isbns))
+        self.assertFalse(BookCountByAuthor.objects.filter(books__gt=0).exists())
+
+    @patch("httpx.get")
+    def test_bulk_partial_update_invalidates_cache(self, mock_get):
+        mock_get.return_value.json.return_value = {}
+        detail_url = reverse("book-detail", args=["9780544003415"])
+        self.client.get(detail_url)
+
+        self.client.patch(self.bulk_url, {"isbns": ["9780544003415"], "changes": {"title": "Fixed"}}, format="json")
+
+        self.assertEqual(self.client.get(detail_url).data["title"], "Fixed")
+
+    def test_bulk_partial_update_validates_changes(self):
+        for changes in (
+            {"isbn": "9780000000002"},
+            {},
+            {"publication_date": "not a date"},
+            {"bogus": 1},
+            {"updated_at": "2020-01-01T00:00:00Z"},
+        ):
+            response = self.client.patch(self.bulk_url, {"isbns": ["9780544003415"], "changes": changes}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Book.objects.exclude(title__startswith="Book ").exists())
+
+    @patch("httpx.get")
+    def test_bulk_delete(self, mock_get):
+        mock_get.return_value.json.return_value = {}
+        detail_url = reverse("book-detail", args=["9780544003415"])
+        self.client.get(detail_url)
+
+        response = self.client.post(
+            self.bulk_delete_url, {"isbns": ["9780544003415", "9780547928227", "9780000000002"]}, format="json"
+        )
+
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual([result["result"] for result in response.data["results"]], ["deleted", "deleted", "not_found"])
+        self.assertEqual(list(Book.objects.values_list("isbn", flat=True)), ["9780747532699"])
+        self.assertEqual(BookTombstone.objects.count(), 2)
+        self.assertEqual(self.client.get(detail_url).status_code, status.HTTP_404_NOT_FOUND)
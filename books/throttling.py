@@ -0,0 +1,92 @@
+"""
+Sliding window rate limiting on Redis.
+
+DRF's own throttles keep the request history in the Django cache with a read followed by a write, which is neither
+atomic across gunicorn workers nor a single round trip. Here, each check is one Lua script call: Redis drops the
+requests that left the window, counts the ones left and records the new request, all atomically.
+
+Requests are counted per client, per scope and per viewset action. Clients are identified by their IP address (see
+NUM_PROXIES in the settings), not by anything they send, since a client could change it to get a fresh budget.
+There are two scopes, with separate rates in REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]:
+- `books-cheap`, checked on every request to the viewset;
+- `books-expensive`, checked by the viewset only on paths that hit Postgres or OpenLibrary hard (see BookViewSet).
+If Redis is unavailable, requests are let through: rate limiting should not take the API down with it.
+"""
+
+import logging
+import math
+import uuid
+
+import redis
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+logger = logging.getLogger(__name__)
+
+SLIDING_WINDOW_SCRIPT = """
+local key = KEYS[1]
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+redis.call("ZREMRANGEBYSCORE", key, "-inf", now - window)
+if redis.call("ZCARD", key) < limit then
+    redis.call("ZADD", key, now, ARGV[3])
+    redis.call("PEXPIRE", key, window)
+    return 0
+end
+local oldest = redis.call("ZRANGE", key, 0, 0, "WITHSCORES")
+return tonumber(oldest[2]) + window - now
+"""
+
+_client = None
+_sliding_window = None
+
+
+def sliding_window(key, window_ms, limit):
+    """
+    Records a request in the sliding window of `key` if there is room for it.
+    Returns 0 if the request is allowed, or the number of milliseconds until it would be.
+    """
+    global _client, _sliding_window  # noqa: PLW0603
+    if _client is None:
+        _client = redis.Redis.from_url(settings.THROTTLE_REDIS_URL, socket_timeout=0.2, socket_connect_timeout=0.2)
+        # register_script calls EVALSHA, and only sends the script again if Redis doesn't know it yet
+        _sliding_window = _client.register_script(SLIDING_WINDOW_SCRIPT)
+    return int(_sliding_window(keys=[key], args=[window_ms, limit, uuid.uuid4().hex]))
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    retry_after_ms = 0
+
+    def get_rate(self):
+        # A scope without a rate is not throttled
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        return f"throttle:{self.scope}:{getattr(view, 'action', None)}:{self.get_ident(request)}"
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        try:
+            self.retry_after_ms = sliding_window(
+                self.get_cache_key(request, view), self.duration * 1000, self.num_requests
+            )
+        except redis.RedisError:
+            logger.exception("Rate limiting is unavailable, letting the request through")
+            return True
+        return self.retry_after_ms == 0
+
+    def wait(self):
+        return math.ceil(self.retry_after_ms / 1000)
+
+
+class CheapRequestThrottle(SlidingWindowRateThrottle):
+    scope = "books-cheap"
+
+
+class ExpensiveRequestThrottle(SlidingWindowRateThrottle):
+    scope = "books-expensive"
@@ -1,28 +1,130 @@
 import logging
 import textwrap
+import time
+from collections import Counter
 from json import JSONDecodeError
 
 import httpx
-from drf_spectacular.utils import extend_schema, extend_schema_view, inline_serializer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.http import Http404
+from django.utils import timezone
+from drf_spectacular.utils import (
+    OpenApiParameter,
+    extend_schema,
+    extend_schema_view,
+    inline_serializer,
+)
 from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
+from books import archive, autocomplete, bloom, instrumentation, metrics, stats
+from books.changes import changes_after, decode_cursor, encode_cursor
 from books.decorators import viewset_cache_detail_with_reset_on_update
+from books.isbn import canonical_isbn
 from books.models import Book
+from books.negotiation import APIModeContentNegotiation
 from books.paginators import BookPagination
-from books.serializers import BookSerializer
+from books.routers import pin_reads_to_primary
+from books.serializers import (
+    BookSerializer,
+    BulkDeleteSerializer,
+    BulkPartialUpdateSerializer,
+)
+from books.throttling import CheapRequestThrottle, ExpensiveRequestThrottle
 
 logger = logging.getLogger(__name__)
 
+OPENLIBRARY_FIELD = "raw_openlibrary_data"
+OPENLIBRARY_CACHE_TIMEOUT = 60 * 5
+
+fields_parameter = OpenApiParameter(
+    "fields",
+    description=textwrap.dedent(
+        """
+        Comma separated list of the fields to return, e.g. `isbn,title,author`. All fields are returned by default.
+        Only the requested fields are loaded from the database.
+        """
+    ),
+)
+
+change_feed_response = inline_serializer(
+    name="BookChanges",
+    fields={
+        "results": inline_serializer(
+            name="BookChange",
+            many=True,
+            fields={
+                "isbn": serializers.CharField(),
+                "deleted": serializers.BooleanField(),
+                "changed_at": serializers.DateTimeField(),
+                "book": BookSerializer(allow_null=True),
+            },
+        ),
+        "cursor": serializers.CharField(allow_null=True),
+        "has_more": serializers.BooleanField(),
+    },
+)
+
+stats_response = inline_serializer(
+    name="CatalogStats",
+    fields={
+        "total": serializers.IntegerField(),
+        "by_decade": inline_serializer(
+            name="DecadeCount",
+            many=True,
+            fields={"decade": serializers.IntegerField(), "books": serializers.IntegerField()},
+        ),
+        "by_year": inline_serializer(
+            name="YearCount",
+            many=True,
+            fields={"year": serializers.IntegerField(), "books": serializers.IntegerField()},
+        ),
+        "top_authors": inline_serializer(
+            name="AuthorCount",
+            many=True,
+            fields={"author": serializers.CharField(), "books": serializers.IntegerField()},
+        ),
+    },
+)
+
+bulk_response = inline_serializer(
+    name="BulkResult",
+    fields={
+        "count": serializers.IntegerField(help_text="How many books were updated or deleted."),
+        "results": inline_serializer(
+            name="BulkResultItem",
+            many=True,
+            fields={"isbn": serializers.CharField(), "result": serializers.CharField()},
+        ),
+    },
+)
 
-@viewset_cache_detail_with_reset_on_update(timeout=60 * 5)
+openlibrary_fields_parameter = OpenApiParameter(
+    "openlibrary_fields",
+    description=textwrap.dedent(
+        """
+        Comma separated list of the keys of the OpenLibrary data to return in `raw_openlibrary_data`,
+        or `*` for all of them. By default, only the keys in the OPENLIBRARY_FIELDS setting are returned.
+        """
+    ),
+)
+
+
+@viewset_cache_detail_with_reset_on_update(timeout=60 * 5, normalize_lookup=canonical_isbn, compress=True)
 @extend_schema_view(
-    create=extend_schema(description="Inserts a new book, using ISBN as primary key"),
+    create=extend_schema(
+        description="Inserts a new book, using ISBN as primary key. ISBN-10s are stored and returned as their ISBN-13."
+    ),
     destroy=extend_schema(description="Deletes the book with given ISBN"),
     list=extend_schema(
-        description="Retrieves all the books in the system with pagination. Default is 10 items per page, ordered by creation date."
+        description="Retrieves all the books in the system with pagination. Default is 10 items per page, ordered by creation date.",
+        parameters=[fields_parameter],
     ),
     partial_update=extend_schema(
         description=textwrap.dedent(
@@ -35,19 +137,24 @@ logger = logging.getLogger(__name__)
     retrieve=extend_schema(
         description=textwrap.dedent(
             """
-            Retrieves a book by ISBN.
+            Retrieves a book by ISBN. The ISBN-10 and the ISBN-13 of a book are equivalent, with or without hyphens.
             We also try to get extra data from openlibrary API and make it available in the field `raw_openlibrary_data`.
             OpenLibrary API data is cached for 5 minutes by default, but the cache can be invalidated by updating the book.
+            The data is cached per book, whatever the query string, so every variant of the response shares it.
         
             If, for some reason, the openlibrary API fails, we return the internal data only and log the failure.
+
+            With `?fields=`, the OpenLibrary API is only called if `raw_openlibrary_data` is one of the fields.
+            Requests with a query string are not cached.
             """
         ),
+        parameters=[fields_parameter, openlibrary_fields_parameter],
         responses={
             200: inline_serializer(
                 name="BookWithOpenLibrary",
                 fields={
                     **BookSerializer().fields,
-                    "raw_openlibrary_data": serializers.JSONField(required=False),
+                    OPENLIBRARY_FIELD: serializers.JSONField(required=False),
                 },
             )
         },
@@ -60,42 +167,397 @@ class BookViewSet(ModelViewSet[Book]):
     serializer_class = BookSerializer
     pagination_class = BookPagination
     permission_classes = [AllowAny]
+    content_negotiation_class = APIModeContentNegotiation
+    throttle_classes = [CheapRequestThrottle]
+    # List pages after this one are throttled as expensive requests, since Postgres has to skip all the previous rows
+    expensive_page_threshold = 100
+    change_feed_default_limit = 100
+    change_feed_max_limit = 1000
+    stats_default_top_authors = 100
+    stats_max_top_authors = 1000
+    autocomplete_default_limit = 10
+    autocomplete_max_limit = 50
+    autocomplete_max_prefix_length = 100
+
+    def get_requested_fields(self):
+        """
+        Parses the `?fields=` query parameter of list and retrieve requests.
+        Returns None when the parameter is absent, which means all fields.
+        """
+        if self.action not in ("list", "retrieve") or "fields" not in self.request.query_params:
+            return None
+        fields = [name.strip() for name in self.request.query_params["fields"].split(",") if name.strip()]
+        if not fields:
+            raise ValidationError({"fields": "At least one field must be requested."})
+        allowed_fields = {field.name for field in Book._meta.concrete_fields}  # noqa: SLF001
+        if self.action == "retrieve":
+            allowed_fields.add(OPENLIBRARY_FIELD)
+        if unknown_fields := [name for name in fields if name not in allowed_fields]:
+            raise ValidationError({"fields": f"Unknown fields: {', '.join(unknown_fields)}."})
+        return fields
+
+    def get_openlibrary_fields(self):
+        """
+        Returns the keys of the OpenLibrary data to keep, from `?openlibrary_fields=` or the OPENLIBRARY_FIELDS setting.
+        Returns None to keep them all.
+        """
+        if "openlibrary_fields" in self.request.query_params:
+            fields = [name.strip() for name in self.request.query_params["openlibrary_fields"].split(",") if name.strip()]
+            if not fields:
+                raise ValidationError({"openlibrary_fields": "At least one field must be requested."})
+        else:
+            fields = settings.OPENLIBRARY_FIELDS
+        return None if "*" in fields else fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if (fields := self.get_requested_fields()) is not None:
+            # The primary key is always loaded, the model instances need it. So is updated_at with the OpenLibrary data,
+            # which is cached per version of the book (see cached_openlibrary_data)
+            loaded = [name for name in fields if name != OPENLIBRARY_FIELD]
+            if OPENLIBRARY_FIELD in fields:
+                loaded.append("updated_at")
+            queryset = queryset.only("isbn", *loaded)
+        return queryset
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            # Books that were not updated for a while are in the archive, see books/archive.py
+            if (book := self.get_archived_object()) is None:
+                raise
+            return book
+
+    def get_archived_object(self):
+        """Returns the archived book of a detail request, or None. Writes move the book back to the books table."""
+        try:
+            isbn = canonical_isbn(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError:
+            return None
+        if self.action == "retrieve":
+            if (book := archive.get_archived(isbn)) is not None:
+                self.check_object_permissions(self.request, book)
+            return book
+        # Writes go through the books table, so they are counted, notified and recorded like any other
+        if self.action in ("update", "partial_update", "destroy") and archive.restore(isbn):
+            return super().get_object()
+        return None
+
+    def get_serializer(self, *args, **kwargs):
+        if (fields := self.get_requested_fields()) is not None:
+            kwargs.setdefault("fields", fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def check_expensive_throttle(self, request):
+        throttle = ExpensiveRequestThrottle()
+        if not throttle.allow_request(request, self):
+            self.throttled(request, throttle.wait())
+
+    def list(self, request, *args, **kwargs):
+        page_number = request.query_params.get(self.paginator.page_query_param, "")
+        # Other page numbers, like "last", can be as deep as the list goes
+        if page_number and not (page_number.isdigit() and int(page_number) <= self.expensive_page_threshold):
+            self.check_expensive_throttle(request)
+        return super().list(request, *args, **kwargs)
 
     def retrieve(self, request, *args, **kwargs):
 
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        # Try to get extra data from openlibrary API, or none if it fails
+        # Books that are definitely not in the catalog are answered without querying the database
         try:
-            #  OpenLibrary API by default moves us to its own identifier, so we need to follow the redirect
+            isbn = canonical_isbn(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError as error:
+            raise Http404 from error
+        if not bloom.might_contain(isbn):
+            raise Http404
+        # Cache hits never get here, so everything below is the expensive path
+        self.check_expensive_throttle(request)
+        # Unless the request skips the cache, this only runs on cache misses and its result is cached,
+        # so it reads from the primary: a lagging replica could put an outdated book in the cache
+        # right after an update invalidated it.
+        with pin_reads_to_primary():
+            instance = self.get_object()
+        serializer = self.get_serializer(instance)
+        fields = self.get_requested_fields()
+        if fields is not None and OPENLIBRARY_FIELD not in fields:
+            return Response(serializer.data)
+        openlibrary_fields = self.get_openlibrary_fields()
+        if openlibrary_data := cached_openlibrary_data(instance):
+            # Most of the edition JSON is never read by clients, this keeps it out of the cache and of the response
+            if openlibrary_fields is not None:
+                openlibrary_data = {key: openlibrary_data[key] for key in openlibrary_fields if key in openlibrary_data}
+            return Response({**serializer.data, OPENLIBRARY_FIELD: openlibrary_data})
+        return Response(serializer.data)
+
+    @extend_schema(
+        description=textwrap.dedent(
+            """
+            Lists the books created, updated or deleted after `cursor`, oldest first, so mirrors of the catalog
+            can sync only what changed since their last sync.
+            Start without a cursor to get every book, then pass the `cursor` of each response to get the next changes.
+            When `has_more` is false, the mirror is up to date; keep the cursor and poll again later.
+            Deleted books have `deleted` set and no `book`. A book may show up more than once if it changed again,
+            only its last change matters.
+            Changes from the last few seconds are only returned once they are settled (see CHANGE_FEED_DELAY_SECONDS).
+            """
+        ),
+        parameters=[
+            OpenApiParameter("cursor", description="The `cursor` returned by the previous call."),
+            OpenApiParameter("limit", int, description="How many changes to return. Default is 100, maximum is 1000."),
+        ],
+        responses={200: change_feed_response},
+    )
+    @action(detail=False, pagination_class=None)
+    def changes(self, request):
+        position = None
+        if cursor := request.query_params.get("cursor"):
+            try:
+                position = decode_cursor(cursor)
+            except ValueError as error:
+                raise ValidationError({"cursor": "This is not a cursor returned by this endpoint."}) from error
+        limit = request.query_params.get("limit", str(self.change_feed_default_limit))
+        if not limit.isdigit() or not 0 < int(limit) <= self.change_feed_max_limit:
+            raise ValidationError({"limit": f"Must be a number between 1 and {self.change_feed_max_limit}."})
+
+        changes, has_more = changes_after(position, int(limit))
+        results = [
+            {
+                "isbn": change.isbn,
+                "deleted": change.book is None,
+                "changed_at": change.changed_at,
+                "book": None if change.book is None else BookSerializer(change.book).data,
+            }
+            for change in changes
+        ]
+        if changes:
+            cursor = encode_cursor(changes[-1].position)
+        return Response({"results": results, "cursor": cursor or None, "has_more": has_more})
+
+    @extend_schema(
+        description=textwrap.dedent(
+            """
+            Returns the number of books in the catalog, per decade and per year of publication,
+            and the authors with the most books.
+            The counts are kept up to date as books are written, so this doesn't scan the books table.
+            """
+        ),
+        parameters=[
+            OpenApiParameter(
+                "top_authors", int, description="How many authors to return. Default is 100, maximum is 1000."
+            ),
+        ],
+        responses={200: stats_response},
+    )
+    @action(detail=False, pagination_class=None)
+    def stats(self, request):
+        top_authors = request.query_params.get("top_authors", str(self.stats_default_top_authors))
+        if not top_authors.isdigit() or int(top_authors) > self.stats_max_top_authors:
+            raise ValidationError({"top_authors": f"Must be a number between 0 and {self.stats_max_top_authors}."})
+        return Response(stats.catalog_stats(int(top_authors)))
+
+    @extend_schema(
+        description=textwrap.dedent(
+            """
+            Returns the titles or the authors starting with `q`, ignoring case, in alphabetical order.
+            Titles come with the ISBN of their book, authors with their number of books.
+            Results are cached in memory until a book is written.
+            """
+        ),
+        parameters=[
+            OpenApiParameter("q", description="The prefix to complete.", required=True),
+            OpenApiParameter("field", enum=autocomplete.FIELDS, description="What to complete. Default is `title`."),
+            OpenApiParameter("limit", int, description="How many results to return. Default is 10, maximum is 50."),
+        ],
+        responses={
+            200: inline_serializer(
+                name="Autocomplete",
+                fields={"results": serializers.ListField(child=serializers.DictField())},
+            )
+        },
+    )
+    @action(detail=False, pagination_class=None)
+    def autocomplete(self, request):
+        prefix = request.query_params.get("q", "")
+        field = request.query_params.get("field", "title")
+        limit = request.query_params.get("limit", str(self.autocomplete_default_limit))
+        errors = {}
+        if not prefix.strip() or len(prefix) > self.autocomplete_max_prefix_length:
+            errors["q"] = f"Must be between 1 and {self.autocomplete_max_prefix_length} characters."
+        if field not in autocomplete.FIELDS:
+            errors["field"] = f"Must be one of: {', '.join(autocomplete.FIELDS)}."
+        if not limit.isdigit() or not 0 < int(limit) <= self.autocomplete_max_limit:
+            errors["limit"] = f"Must be a number between 1 and {self.autocomplete_max_limit}."
+        if errors:
+            raise ValidationError(errors)
+        return Response({"results": autocomplete.cached_matches(field, prefix, int(limit))})
+
+    def canonical_isbns(self, isbns):
+        """Returns the canonical form of each ISBN, or None for the ones that are not ISBNs."""
+        canonical = {}
+        for isbn in isbns:
+            try:
+                canonical[isbn] = canonical_isbn(isbn)
+            except ValueError:
+                canonical[isbn] = None
+        return canonical
+
+    @extend_schema(
+        description=textwrap.dedent(
+            """
+            Applies the same partial update to all the books in `isbns` (1000 at most), e.g. to fix an author name.
+            `changes` is validated like the body of a PATCH, and ISBNs cannot be changed.
+            All the books are updated with a single statement, in a single transaction.
+            The response has the outcome for each ISBN: `updated`, `not_found` or `invalid` (not an ISBN).
+            """
+        ),
+        request=BulkPartialUpdateSerializer,
+        responses={200: bulk_response},
+    )
+    @action(detail=False, methods=["patch"], url_path="bulk", pagination_class=None)
+    def bulk_partial_update(self, request):
+        self.check_expensive_throttle(request)
+        serializer = BulkPartialUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        isbns = self.canonical_isbns(serializer.validated_data["isbns"])
+        changes = serializer.validated_data["changes"]
+
+        with transaction.atomic():
+            candidates = set(filter(None, isbns.values()))
+            # Archived books are part of the catalog, they are moved back to be written like the others
+            archive.restore_many(candidates)
+            books = Book.objects.select_for_update().filter(isbn__in=candidates)
+            previous = {isbn: (author, date) for isbn, author, date in books.values_list("isbn", "author", "publication_date")}
+            Book.objects.filter(isbn__in=previous).update(**changes, updated_at=timezone.now())
+            # QuerySet.update skips the signals, so what they do for a single book is done here for all of them
+            if "author" in changes or "publication_date" in changes:
+                deltas = Counter()
+                for author, publication_date in previous.values():
+                    deltas[stats.stats_key(author, publication_date)] -= 1
+                    deltas[
+                        stats.stats_key(changes.get("author", author), changes.get("publication_date", publication_date))
+                    ] += 1
+                stats.apply_deltas(deltas)
+        autocomplete.invalidate()
+        self.invalidate_cached_details(request, previous)
+
+        return Response(self.bulk_results(isbns, previous, "updated"))
+
+    @extend_schema(
+        description=textwrap.dedent(
+            """
+            Deletes all the books in `isbns` (1000 at most) with a single statement, in a single transaction.
+            The response has the outcome for each ISBN: `deleted`, `not_found` or `invalid` (not an ISBN).
+            """
+        ),
+        request=BulkDeleteSerializer,
+        responses={200: bulk_response},
+    )
+    @action(detail=False, methods=["post"], url_path="bulk-delete", pagination_class=None)
+    def bulk_destroy(self, request):
+        self.check_expensive_throttle(request)
+        serializer = BulkDeleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        isbns = self.canonical_isbns(serializer.validated_data["isbns"])
+
+        with transaction.atomic():
+            candidates = set(filter(None, isbns.values()))
+            # Archived books are part of the catalog, they are moved back to be written like the others
+            archive.restore_many(candidates)
+            books = Book.objects.select_for_update().filter(isbn__in=candidates)
+            deleted = {isbn: (author, date) for isbn, author, date in books.values_list("isbn", "author", "publication_date")}
+            # QuerySet.delete would send the signals for each book, so the books are deleted with a single statement
+            # and what the signals do for a single book is done here for all of them
+            if deleted:
+                self.delete_books(deleted)
+            deltas = Counter()
+            for author, publication_date in deleted.values():
+                deltas[stats.stats_key(author, publication_date)] -= 1
+            stats.apply_deltas(deltas)
+        autocomplete.invalidate()
+        bloom.record_delete(len(deleted))
+        self.invalidate_cached_details(request, deleted)
+
+        return Response(self.bulk_results(isbns, deleted, "deleted"))
+
+    @staticmethod
+    def delete_books(isbns):
+        """Deletes the books with these canonical ISBNs with a single DELETE, without sending any signal."""
+        connection = connections[router.db_for_write(Book)]
+        placeholders = ", ".join(["%s"] * len(isbns))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {connection.ops.quote_name(Book._meta.db_table)} WHERE isbn IN ({placeholders})",  # noqa: S608, SLF001
+                [Book._meta.pk.get_prep_value(isbn) for isbn in isbns],  # noqa: SLF001
+            )
+
+    @staticmethod
+    def bulk_results(isbns, done, outcome):
+        results = []
+        for isbn, canonical in isbns.items():
+            if canonical is None:
+                results.append({"isbn": isbn, "result": "invalid"})
+            else:
+                results.append({"isbn": canonical, "result": outcome if canonical in done else "not_found"})
+        return {"count": sum(result["result"] == outcome for result in results), "results": results}
+
+
+def cached_openlibrary_data(book):
+    """
+    Same as fetch_openlibrary_data(), but the whole OpenLibrary data is cached per book, separately from the responses,
+    so requests that skip the detail cache (e.g. with ?fields= or ?openlibrary_fields=) don't call the API either.
+    The key has the book's updated_at, so the data is fetched again once the book is updated, in bulk too.
+    """
+    key = f"openlibrary:{book.isbn}:{book.updated_at.timestamp()}"
+    if (data := cache.get(key)) is None:
+        # Failures are cached as empty data, like the responses without it, so a failing API is not called every time
+        data = fetch_openlibrary_data(book.isbn) or {}
+        cache.set(key, data, OPENLIBRARY_CACHE_TIMEOUT)
+    return data or None
+
+
+def fetch_openlibrary_data(isbn):
+    """
+    Gets extra data for the book from the OpenLibrary API.
+    Returns None if the API fails or has no data for the book; failures are logged and counted in the metrics.
+    """
+    outcome = "empty"
+    start = time.perf_counter()
+    try:
+        #  OpenLibrary API by default moves us to its own identifier, so we need to follow the redirect
+        with instrumentation.timer("openlibrary"):
             response = httpx.get(
-                f"https://openlibrary.org/isbn/{instance.isbn}.json",
+                f"https://openlibrary.org/isbn/{isbn}.json",
                 follow_redirects=True,
                 timeout=2,
             )
-            if response.json():
-                return Response(
-                    {**serializer.data, "raw_openlibrary_data": response.json()}
-                )
-        except httpx.ConnectError:
-            logger.exception(
-                "Connection error in OpenLibrary API on ISBN %(isbn):",
-                extra={"isbn": instance.isbn},
-            )
-        except httpx.TimeoutException:
-            logger.exception(
-                "Timeout in OpenLibrary API on ISBN  %(isbn):",
-                extra={"isbn": instance.isbn},
-            )
-        except httpx.HTTPError:
-            logger.exception(
-                "HTTP error in OpenLibrary on ISBN %(isbn):",
-                extra={"isbn": instance.isbn},
-            )
-        except JSONDecodeError:
-            logger.exception(
-                "Invalid JSON received from OpenLibrary on ISBN %(isbn):",
-                extra={"isbn": instance.isbn},
-            )
+        if data := response.json():
+            outcome = "success"
+            return data
+    except httpx.ConnectError:
+        outcome = "ConnectError"
+        logger.exception(
+            "Connection error in OpenLibrary API on ISBN %(isbn):",
+            extra={"isbn": isbn},
+        )
+    except httpx.TimeoutException:
+        outcome = "TimeoutException"
+        logger.exception(
+            "Timeout in OpenLibrary API on ISBN  %(isbn):",
+            extra={"isbn": isbn},
+        )
+    except httpx.HTTPError:
+        outcome = "HTTPError"
+        logger.exception(
+            "HTTP error in OpenLibrary on ISBN %(isbn):",
+            extra={"isbn": isbn},
+        )
+    except JSONDecodeError:
+        outcome = "JSONDecodeError"
+        logger.exception(
+            "Invalid JSON received from OpenLibrary on ISBN %(isbn):",
+            extra={"isbn": isbn},
+        )
+    finally:
+        metrics.OPENLIBRARY_REQUESTS.labels(outcome=outcome).observe(time.perf_counter() - start)
 
-        return Response(serializer.data)
+    return None
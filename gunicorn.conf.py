@@ -0,0 +1,62 @@
+"""
+Gunicorn configuration, loaded automatically when gunicorn runs from the project root.
+Every setting can be changed through environment variables, see .env.example for the production profile.
+See https://docs.gunicorn.org/en/stable/settings.html
+"""
+
+import gc
+import multiprocessing
+import os
+import shutil
+import time
+from pathlib import Path
+
+from prometheus_client import multiprocess
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+# gthread workers let a worker serve other requests while one waits on Postgres, Redis or OpenLibrary.
+# Use GUNICORN_WORKER_CLASS=sync and GUNICORN_THREADS=1 to get gunicorn's defaults back.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+
+# Preloading imports the application once in the master process, before forking the workers.
+# The master also warms it up, see when_ready()
+preload_app = os.environ.get("GUNICORN_PRELOAD") == "True"
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+
+# Recycling workers now and then caps memory growth. The jitter avoids restarting all workers at once.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
+prometheus_multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+
+def on_starting(server):
+    # Metrics files from a previous run would be aggregated with the new ones, so we start from an empty directory
+    if prometheus_multiproc_dir:
+        shutil.rmtree(prometheus_multiproc_dir, ignore_errors=True)
+        Path(prometheus_multiproc_dir).mkdir(parents=True)
+
+
+def when_ready(server):
+    # Runs in the master before the workers are forked. What is built here is shared by all workers, see books/startup.py
+    if not server.cfg.preload_app:
+        return
+    from books.startup import warm_up
+
+    start = time.perf_counter()
+    warm_up()
+    # Objects that exist now are never collected, so the garbage collector of the workers doesn't write to them, which
+    # would copy their memory pages into each worker
+    gc.freeze()
+    server.log.info("Warmed up the application in %.2fs", time.perf_counter() - start)
+
+
+def child_exit(server, worker):
+    if prometheus_multiproc_dir:
+        multiprocess.mark_process_dead(worker.pid)